@@ -0,0 +1,38 @@
+# Compares re-parsing goals and proof scripts from text against decoding their precompiled binary form.
+# Run with: python benchmarks/bench_codec.py
+import timeit
+
+import bench_path  # noqa: F401
+import pred_check.PredicateExpression as PredExp
+import pred_check.PredicateProofChecker as PredPC
+import prop_check.PropositionalExpression as PropExp
+import prop_check.PropositionalProofChecker as PropPC
+
+_PROP_GOAL = "(p ==> q) /\\ (q ==> r) /\\ (r ==> s) ==> (p ==> s) \\/ ~(p /\\ ~s) <=> (s \\/ ~p)"
+_PRED_GOAL = "(all x) (all y) [P(x, y) /\\ Q(y) ==> (exists z) [R(x, z) \\/ ~P(z, 10)]] <=> ~(exists w) S(w, 3)"
+_PROP_STEP = " = (y \\/ x) /\\ (y \\/ False)     { \\/ commutative }\n"
+_PRED_STEP = " = (exists x) (exists y) [P(x, 10) ==> ~Q(y)]    { migrate y }\n"
+
+
+def bench(name, text, parse, data, decode):
+    parsed = min(timeit.repeat(lambda: parse(text), number=200, repeat=3)) / 200
+    decoded = min(timeit.repeat(lambda: decode(data), number=200, repeat=3)) / 200
+    print("{:<20} text {:6} B  binary {:6} B   parse {:8.1f}us  decode {:8.1f}us  speedup {:5.1f}x"
+          .format(name, len(text), len(data), parsed * 1e6, decoded * 1e6, parsed / decoded))
+
+
+if __name__ == "__main__":
+    goal = PropExp.PropositionalExpression.parse(_PROP_GOAL)
+    bench("prop goal", _PROP_GOAL, PropExp.PropositionalExpression.parse,
+          goal.to_bytes(), PropExp.PropositionalExpression.from_bytes)
+    goal = PredExp.PredicateExpression.parse(_PRED_GOAL)
+    bench("pred goal", _PRED_GOAL, PredExp.PredicateExpression.parse,
+          goal.to_bytes(), PredExp.PredicateExpression.from_bytes)
+    script = "x /\\ y\n" + _PROP_STEP * 50
+    steps = PropPC.PropositionalProof.parse_proof_script(script)
+    bench("prop proof steps", script, PropPC.PropositionalProof.parse_proof_script,
+          PropPC.PropositionalProof.steps_to_bytes(steps), PropPC.PropositionalProof.steps_from_bytes)
+    script = "P(0)\n" + _PRED_STEP * 50
+    steps = PredPC.PredicateProof.parse_proof_script(script)
+    bench("pred proof steps", script, PredPC.PredicateProof.parse_proof_script,
+          PredPC.PredicateProof.steps_to_bytes(steps), PredPC.PredicateProof.steps_from_bytes)
@@ -0,0 +1,53 @@
+# Compares the tree-walking evaluators against compiled formulas, both row by row and over a whole truth table.
+# Run with: python benchmarks/bench_compile.py
+import itertools
+import timeit
+
+import bench_path  # noqa: F401
+import prop_check.PropositionalExpression as PExp
+
+_ATOMS = 18
+
+
+def make_formula(atoms):
+    # (p0 /\ p1 ==> p2) /\ (p1 /\ p2 ==> p3) ... <=> its contrapositive form, a tautology over every atom
+    names = ["p" + str(i) for i in range(atoms)]
+    lhs = rhs = None
+    for a, b, c in zip(names, names[1:], names[2:]):
+        p, q, r = PExp.VariableExpression(a), PExp.VariableExpression(b), PExp.VariableExpression(c)
+        lhs_i = PExp.ImpliesExpression(PExp.AndExpression(p, q), r)
+        rhs_i = PExp.OrExpression(PExp.OrExpression(PExp.NotExpression(p), PExp.NotExpression(q)), r)
+        lhs = lhs_i if lhs is None else PExp.AndExpression(lhs, lhs_i)
+        rhs = rhs_i if rhs is None else PExp.AndExpression(rhs, rhs_i)
+    return PExp.IffExpression(lhs, rhs), names
+
+
+def walk_table(expr, names):
+    for chunk in range(1 << (len(names) - PExp._WORD_VARS)):
+        columns = {}
+        for i, name in enumerate(names):
+            bit = len(names) - 1 - i
+            if bit < PExp._WORD_VARS:
+                columns[name] = PExp.PropositionalExpression.bit_column(bit, 1 << PExp._WORD_VARS)
+            else:
+                columns[name] = 0 if (chunk >> (bit - PExp._WORD_VARS)) & 1 else (1 << (1 << PExp._WORD_VARS)) - 1
+        expr.eval_bits(columns, (1 << (1 << PExp._WORD_VARS)) - 1)
+
+
+def compile_and_check(expr, names):
+    expr.compiled = None
+    return expr.find_falsifying_bindings(names)
+
+
+if __name__ == "__main__":
+    expr, names = make_formula(_ATOMS)
+    rows = list(itertools.islice(itertools.product([True, False], repeat=len(names)), 2000))
+    walked = min(timeit.repeat(lambda: [expr.eval(dict(zip(names, row))) for row in rows], number=1, repeat=3))
+    evaluate = expr.compile(names)
+    compiled = min(timeit.repeat(lambda: [evaluate(1, *row) for row in rows], number=1, repeat=3))
+    print("{:<24} {:>5} rows   eval {:8.4f}s  compiled {:8.4f}s  speedup {:6.1f}x"
+          .format("row by row", len(rows), walked, compiled, walked / compiled))
+    walked = min(timeit.repeat(lambda: walk_table(expr, names), number=1, repeat=3))
+    compiled = min(timeit.repeat(lambda: compile_and_check(expr, names), number=1, repeat=3))
+    print("{:<24} {:>5} atoms  eval_bits {:8.4f}s  compiled {:8.4f}s  speedup {:6.1f}x"
+          .format("truth table", len(names), walked, compiled, walked / compiled))
@@ -0,0 +1,35 @@
+# Compares the bit-parallel truth table against the optional NumPy backend on tautologies of growing size. The
+# backend is not an is_tautology strategy until it wins here across sizes.
+# Run with: python benchmarks/bench_numpy.py
+import timeit
+
+import bench_path  # noqa: F401
+import prop_check.PropositionalExpression as PExp
+
+_ATOMS = [14, 18, 22]
+
+
+def make_formula(atoms):
+    # (p0 /\ p1 ==> p2) /\ (p1 /\ p2 ==> p3) ... <=> its contrapositive form, a tautology over every atom
+    names = ["p" + str(i) for i in range(atoms)]
+    lhs = rhs = None
+    for a, b, c in zip(names, names[1:], names[2:]):
+        p, q, r = PExp.VariableExpression(a), PExp.VariableExpression(b), PExp.VariableExpression(c)
+        lhs_i = PExp.ImpliesExpression(PExp.AndExpression(p, q), r)
+        rhs_i = PExp.OrExpression(PExp.OrExpression(PExp.NotExpression(p), PExp.NotExpression(q)), r)
+        lhs = lhs_i if lhs is None else PExp.AndExpression(lhs, lhs_i)
+        rhs = rhs_i if rhs is None else PExp.AndExpression(rhs, rhs_i)
+    return PExp.IffExpression(lhs, rhs), names
+
+
+if __name__ == "__main__":
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        raise SystemExit("NumPy is not installed; nothing to compare")
+    for atoms in _ATOMS:
+        expr, names = make_formula(atoms)
+        bits = min(timeit.repeat(lambda: expr.find_falsifying_bindings(names), number=1, repeat=3))
+        vectorized = min(timeit.repeat(lambda: expr.find_falsifying_bindings_numpy(names), number=1, repeat=3))
+        print("{:>3} atoms   bits {:8.4f}s  numpy {:8.4f}s  speedup {:6.1f}x"
+              .format(atoms, bits, vectorized, bits / vectorized))
@@ -0,0 +1,7 @@
+# Puts src on sys.path so each benchmark runs as a plain script from any directory; import it before the packages.
+import os
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
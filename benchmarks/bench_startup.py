@@ -0,0 +1,40 @@
+# Measures the cold-start import time of each handler with python -X importtime, in fresh interpreters.
+# Run with: python benchmarks/bench_startup.py
+import os
+import statistics
+import subprocess
+import sys
+
+import bench_path
+
+_HANDLERS = ["prop_check.lambda_function", "pred_check.lambda_function", "grader"]
+_RUNS = 7
+
+
+def import_times(module):
+    env = dict(os.environ, PYTHONPATH=bench_path.SRC)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            capture_output=True, text=True, check=True, env=env)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def bench(module):
+    runs = [import_times(module) for _ in range(_RUNS)]
+    total = statistics.median(times[module][1] for times in runs)
+    print("{:<28} {:8.1f} ms".format(module, total / 1000))
+    own = {name for name in runs[-1] if name.split(".")[0] in ("prop_check", "pred_check", "grader")}
+    slowest = sorted(own, key=lambda name: -statistics.median(times.get(name, (0, 0))[0] for times in runs))
+    for name in slowest[:5]:
+        print("    {:<36} {:8.1f} ms self".format(name, statistics.median(times[name][0] for times in runs) / 1000))
+
+
+if __name__ == "__main__":
+    for handler in _HANDLERS:
+        import_times(handler)
+        bench(handler)
@@ -0,0 +1,64 @@
+# Compares the master-pattern tokenizers against the original slicing tokenizers on ~100 KB proof scripts.
+# Run with: python benchmarks/bench_tokenizer.py
+import re
+import timeit
+
+import bench_path  # noqa: F401
+import pred_check.PredicateTokenizer as PredTk
+import prop_check.PropositionalTokenizer as PropTk
+
+_PROP_STEP = "= (y \\\\/ x) /\\\\ (y \\\\/ False)     { \\\\/ commutative }\n"
+_PRED_STEP = " = (exists x) (exists y) [P(x, 10) ==> ~Q(y)]    { migrate y }\n"
+
+
+def legacy_tokenize(tokenizer, expr, with_consts):
+    var_re = re.compile("[a-zA-Z_][a-zA-Z0-9_]*")
+    const_re = re.compile("[0-9]+")
+    tokens = []
+    s = expr.replace("\\\\", "\\").lower()
+    while True:
+        s = s.lstrip()
+        if s == "":
+            break
+        for token in tokenizer.tokens:
+            if s.startswith(token.value):
+                tokens.append(token)
+                s = s[len(token.value):]
+                break
+        else:
+            m = var_re.match(s)
+            if m:
+                tokens.append(m.group())
+                s = s[m.end():]
+            else:
+                m = const_re.match(s) if with_consts else None
+                if not m:
+                    raise ValueError("Unexpected token starting at: " + s)
+                tokens.append(int(m.group()))
+                s = s[m.end():]
+    return tokens
+
+
+def make_script(step, size):
+    return step * (size // len(step) + 1)
+
+
+def check_chunks(tokenizer, script):
+    # Seven-character chunks split "\\\\", "==>" and identifiers across boundaries, so the stream must match
+    chunks = (script[i:i + 7] for i in range(0, len(script), 7))
+    if repr(list(tokenizer.iter_tokens(chunks))) != repr(tokenizer.tokenize(script)):
+        raise AssertionError("chunked tokenization differs from tokenizing the whole script")
+
+
+def bench(name, tokenizer, script, with_consts):
+    assert len(tokenizer.tokenize(script)) == len(legacy_tokenize(tokenizer, script, with_consts))
+    check_chunks(tokenizer, script[:4096])
+    legacy = min(timeit.repeat(lambda: legacy_tokenize(tokenizer, script, with_consts), number=1, repeat=3))
+    current = min(timeit.repeat(lambda: tokenizer.tokenize(script), number=1, repeat=3))
+    print("{:<14} {:>8} bytes  legacy {:8.4f}s  master pattern {:8.4f}s  speedup {:6.1f}x"
+          .format(name, len(script), legacy, current, legacy / current))
+
+
+if __name__ == "__main__":
+    bench("propositional", PropTk.PropositionalProofTokenizer(), make_script(_PROP_STEP, 100 * 1024), False)
+    bench("predicate", PredTk.PredicateProofTokenizer(), make_script(_PRED_STEP, 100 * 1024), True)
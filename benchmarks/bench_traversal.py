@@ -0,0 +1,93 @@
+# Times the tree traversals and parsers on 10,000-deep formulas, far past the default recursion limit, to show they no
+# longer recurse per node. Run with: python benchmarks/bench_traversal.py
+import sys
+import timeit
+
+import bench_path  # noqa: F401
+import pred_check.PredicateExpression as PredExp
+import pred_check.PredicateProofChecker as PredPC
+import prop_check.PropositionalExpression as PropExp
+import prop_check.PropositionalNormalForm as PNF
+import prop_check.PropositionalSatSolver as PropSat
+
+_DEPTH = 10000
+_PROP_OPS = [PropExp.AndExpression, PropExp.OrExpression, PropExp.ImpliesExpression, PropExp.IffExpression]
+_PRED_OPS = [PredExp.AndExpression, PredExp.OrExpression, PredExp.ImpliesExpression, PredExp.IffExpression]
+
+
+def make_prop_chain(depth, tag=""):
+    expr = PropExp.VariableExpression("q" + tag)
+    for i in range(depth):
+        if i % 7 == 0:
+            expr = PropExp.NotExpression(expr)
+        else:
+            expr = _PROP_OPS[i % 4](PropExp.VariableExpression("p" + str(i % 8)), expr)
+    return expr
+
+
+def make_pred_chain(depth):
+    expr = PredExp.PredicateInstanceExpression("Q", [PredExp.VariableExpression("x")])
+    for i in range(depth):
+        if i % 50 == 0:
+            expr = PredExp.ForallExpression(PredExp.VariableExpression("x" + str(i % 3)), expr)
+        elif i % 7 == 0:
+            expr = PredExp.NotExpression(expr)
+        else:
+            args = [PredExp.VariableExpression("x" + str(i % 3)), PredExp.NumericConstantExpression(str(i % 5))]
+            expr = _PRED_OPS[i % 4](PredExp.PredicateInstanceExpression("P", args), expr)
+    return expr
+
+
+def parse_arity_conflict(depth):
+    # The conflicting arity is only found after the whole nested formula is built, and must still be a ValueError
+    text = "(P(x) /\\ " * depth + "P(x, y)" + ")" * depth
+    try:
+        PredExp.PredicateExpression.parse(text)
+    except ValueError:
+        return
+    raise AssertionError("parse accepted a predicate used with two arities")
+
+
+def bench(name, operation, size):
+    elapsed = min(timeit.repeat(operation, number=1, repeat=3))
+    print("{:<32} {:8.4f}s  {:10.0f} nodes/s".format(name, elapsed, size / elapsed))
+
+
+if __name__ == "__main__":
+    prop = make_prop_chain(_DEPTH)
+    pred = make_pred_chain(_DEPTH)
+    print("depth {}  recursion limit {}".format(_DEPTH, sys.getrecursionlimit()))
+    bindings = {"p" + str(i): i % 3 != 0 for i in range(8)}
+    bindings["q"] = True
+    columns = {name: (0b1010 if value else 0b0101) for name, value in bindings.items()}
+    # simplify caches its result on each node, so every repeat gets a chain that has not been simplified yet
+    unsimplified = [make_prop_chain(_DEPTH, str(i)) for i in range(3)]
+    bench("prop eval", lambda: prop.eval(bindings), prop.size)
+    bench("prop eval_bits", lambda: prop.eval_bits(columns, 0b1111), prop.size)
+    bench("prop match", lambda: prop.match(prop, {}), prop.size)
+    bench("prop replace", lambda: prop.replace({"q": PropExp.VariableExpression("r")}), prop.size)
+    bench("prop simplify (uncached)", lambda: unsimplified.pop().simplify(), prop.size)
+    bench("prop to_string", lambda: prop.to_string(), prop.size)
+    bench("prop str", lambda: str(prop), prop.size)
+    bench("prop negation normal form", lambda: PNF.PropositionalNormalForm.convert_to_negation_normal_form(prop),
+          prop.size)
+    bench("prop tseitin encode", lambda: PropSat.TseitinEncoder().encode(prop), prop.size)
+    bench("pred match", lambda: pred.match(pred, {}), pred.size)
+    bench("pred replace", lambda: pred.replace({"x": PredExp.VariableExpression("y")}), pred.size)
+    bench("pred close", lambda: pred.close("x"), pred.size)
+    bench("pred to_string", lambda: pred.to_string(), pred.size)
+    bench("pred str", lambda: str(pred), pred.size)
+    bench("pred check_propositional", lambda: PredPC.PredicateProof.check_propositional(pred, pred), pred.size)
+    bench("pred convert_to_prop", lambda: PredPC.PredicateProof.convert_to_prop(pred, {}, {}), pred.size)
+    x = PredExp.VariableExpression("x")
+    nested = "(R(y) /\\ " * _DEPTH + "{}" + ")" * _DEPTH
+    before = PredExp.PredicateExpression.parse(nested.format("(all x) P(x) /\\ S(z)"))
+    migrated = PredExp.PredicateExpression.parse(nested.format("(all x) [P(x) /\\ S(z)]"))
+    renamed = PredExp.PredicateExpression.parse(nested.format("(all w) P(w) /\\ S(z)"))
+    bench("pred check_migrate", lambda: PredPC.PredicateProof.check_migrate(x, before, migrated), before.size)
+    bench("pred check_rename", lambda: PredPC.PredicateProof.check_rename(x, PredExp.VariableExpression("w"), before,
+                                                                         renamed), before.size)
+    bench("prop parse nested", lambda: PropExp.PropositionalExpression.parse("(" * _DEPTH + "p" + ")" * _DEPTH),
+          _DEPTH)
+    bench("pred parse nested", lambda: PredExp.PredicateExpression.parse(nested.format("P(x)")), before.size)
+    bench("pred parse arity conflict", lambda: parse_arity_conflict(_DEPTH), before.size)
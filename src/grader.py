@@ -0,0 +1,110 @@
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import signal
+import sys
+import traceback
+
+import pred_check.PredicateProofChecker as PredChecker
+import pred_check.lambda_function as PredLambda
+import prop_check.lambda_function as PropLambda
+
+_CACHE = {}
+
+
+class GradingTimeout(BaseException):
+    pass
+
+
+def raise_timeout(_signum, _frame):
+    raise GradingTimeout()
+
+
+def reset_caches():
+    # A timeout can interrupt a cache update halfway, so the worker drops every cache shared between submissions
+    _CACHE.clear()
+    PropLambda.get_step_cache().clear()
+    PredLambda.get_step_cache().clear()
+    PredChecker.PredicateProof.shared_bdd.cache_clear()
+
+
+def init_worker():
+    # Each worker opens its own step caches rather than inheriting connections across fork
+    PropLambda.get_step_cache()
+    PredLambda.get_step_cache()
+
+
+def iter_submissions(path):
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".json"):
+                with open(os.path.join(path, name)) as f:
+                    yield name, f.read()
+    else:
+        with open(path) as f:
+            for number, line in enumerate(f, start=1):
+                if line.strip() != "":
+                    yield "{}:{}".format(os.path.basename(path), number), line
+
+
+def grade_text(text):
+    # noinspection PyBroadException
+    try:
+        submission = json.loads(text)
+        if "goal" in submission:
+            return PredLambda.grade_submission(submission, _CACHE)
+        return PropLambda.grade_submission(submission, _CACHE)
+    except Exception:
+        return {"exception": traceback.format_exc()}
+
+
+def grade(source, text, timeout):
+    try:
+        if timeout:
+            signal.signal(signal.SIGALRM, raise_timeout)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            result = grade_text(text)
+        finally:
+            if timeout:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except GradingTimeout:
+        reset_caches()
+        result = {"exception": "Grading took longer than {} seconds".format(timeout)}
+    result["source"] = source
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade a directory of *.json submissions or a JSONL file of "
+                                                 "submissions, writing one JSON result per line in input order.")
+    parser.add_argument("submissions", help="directory of *.json files or a .jsonl file")
+    parser.add_argument("-o", "--output", help="result file (default: standard output)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("-t", "--timeout", type=float, default=10.0,
+                        help="seconds allowed per submission, 0 for no limit")
+    args = parser.parse_args(argv)
+    if args.timeout and not hasattr(signal, "SIGALRM"):
+        parser.error("--timeout needs SIGALRM, which this platform lacks; use --timeout 0 to grade without a limit")
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as executor:
+            pending = collections.deque()
+            for source, text in iter_submissions(args.submissions):
+                pending.append(executor.submit(grade, source, text, args.timeout))
+                if len(pending) >= 4 * args.workers:
+                    out.write(json.dumps(pending.popleft().result()) + "\n")
+                    out.flush()
+            while pending:
+                out.write(json.dumps(pending.popleft().result()) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+class BindingEnvironment:
+    __slots__ = ("frame", "parent")
+
+    def __init__(self, frame=None, parent=None):
+        self.frame = {} if frame is None else frame
+        self.parent = parent
+
+    @staticmethod
+    def of(bindings):
+        if isinstance(bindings, BindingEnvironment):
+            return bindings
+        return BindingEnvironment(bindings)
+
+    def bind(self, name, value):
+        # Pushing a scope is O(1): the new frame only points at its parent, nothing is copied
+        return BindingEnvironment({name: value}, self)
+
+    def __contains__(self, name):
+        env = self
+        while env is not None:
+            if name in env.frame:
+                return True
+            env = env.parent
+        return False
+
+    def __getitem__(self, name):
+        env = self
+        while env is not None:
+            if name in env.frame:
+                return env.frame[name]
+            env = env.parent
+        raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        self.frame[name] = value
+
+    def items(self):
+        bindings = {}
+        env = self
+        while env is not None:
+            for name, value in env.frame.items():
+                bindings.setdefault(name, value)
+            env = env.parent
+        return bindings.items()
@@ -1,223 +1,282 @@
-import copy
-
+import pred_check.BindingEnvironment as BEnv
 import pred_check.PredicateTokenizer as PTk
+import prop_check.ExpressionCodec as EC
+import prop_check.ExpressionParser as EP
+import prop_check.HashConsed as HC
+import prop_check.TreeFold as TF
+
 
+class PredicateExpression(metaclass=HC.HashConsed):
+    __slots__ = ("structural_hash", "size", "depth", "free_vars", "bound_vars", "outer_vars", "unique_vars",
+                 "arities", "__weakref__")
 
-class PredicateExpression:
     def __repr__(self):
         return str(self)
 
+    def __hash__(self):
+        return self.structural_hash
+
+    def init_structure(self, payload, children):
+        self.structural_hash = hash((type(self).__name__, payload) + tuple(child.structural_hash for child in children))
+        self.size = 1 + sum(child.size for child in children)
+        self.depth = 1 + max((child.depth for child in children), default=0)
+        self.free_vars = frozenset().union(*(child.free_vars for child in children))
+        self.bound_vars = frozenset().union(*(child.bound_vars for child in children))
+        # outer_vars are the variables of the outermost quantifiers, which must not repeat for has_unique_vars
+        outer = [child.outer_vars for child in children]
+        self.outer_vars = frozenset().union(*outer)
+        self.unique_vars = all(child.unique_vars for child in children) and \
+            len(self.outer_vars) == sum(len(vars_i) for vars_i in outer)
+        self.arities = frozenset().union(*(child.arities for child in children))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, _memo):
+        return self
+
+    def equal(self, other):
+        return self is other
+
+    def match(self, other, bindings):
+        return TF.match(self, other, lambda pattern, expr: pattern.match_step(expr, bindings))
+
+    def replace(self, bindings):
+        return TF.fold(self, PredicateExpression.replace_node, enter=PredicateExpression.enter_scope, context=bindings)
+
+    @staticmethod
+    def replace_node(node, values, bindings):
+        return node.replace_step(values, bindings)
+
+    @staticmethod
+    def enter_scope(node, bindings):
+        if isinstance(node, QuantifierExpression):
+            return BEnv.BindingEnvironment.of(bindings).bind(node.var.value, node.var)
+        return bindings
+
+    def replace_step(self, values, _bindings):
+        return self.rebuild(values)
+
+    def rebuild(self, _values):
+        return self
+
+    def close(self, name, depth=0):
+        return TF.fold(self, lambda node, values, node_depth: node.close_step(values, name, node_depth),
+                       lambda node: node.children() if name in node.free_vars else (),
+                       PredicateExpression.scope_depth, depth)
+
+    @staticmethod
+    def scope_depth(node, depth):
+        return depth + 1 if isinstance(node, QuantifierExpression) else depth
+
+    def close_step(self, values, name, _depth):
+        if name not in self.free_vars:
+            return self
+        return self.rebuild(values)
+
+    def to_string(self, level=0):
+        return TF.render(self, lambda node, node_level: node.to_string_parts(node_level), level)
+
+    def __str__(self):
+        return TF.render(self, lambda node, _level: node.str_parts())
+
+    def to_bytes(self):
+        return PredicateExpression.codec.encode(self)
+
+    @staticmethod
+    def from_bytes(data):
+        expr = PredicateExpression.codec.decode(data)
+        if not isinstance(expr, PredicateExpression):
+            raise ValueError("Encoded value is not a predicate expression")
+        return expr
+
     @staticmethod
     def parse(s):
         tokenizer = PTk.PredicateTokenizer()
-        expr, rest = PredicateExpression.parse_expression(tokenizer.tokenize(s))
-        if len(rest) != 0:
-            raise ValueError("Expected END but found tokens: " + PTk.PredicateTokenizer.stringify_tokens(rest))
-        arities = {}
-        expr.check_predicate_arities(arities)
+        cursor = EP.TokenCursor(tokenizer.tokenize(s))
+        expr = PredicateExpression.parse_expression(cursor)
+        if not cursor.at_end():
+            raise ValueError("Expected END but found tokens: " + PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
+        if len(expr.arities) != len({predicate for predicate, _ in expr.arities}):
+            # Walk the tree only when some predicate has two arities, to report them in the original order
+            expr.check_predicate_arities({})
         return expr
 
     @staticmethod
     def parse_literal(s):
         tokenizer = PTk.PredicateTokenizer()
-        expr, rest = PredicateExpression.parse_var_or_const(tokenizer.tokenize(s))
-        if len(rest) != 0:
-            raise ValueError("Expected END but found tokens: " + PTk.PredicateTokenizer.stringify_tokens(rest))
+        cursor = EP.TokenCursor(tokenizer.tokenize(s))
+        expr = PredicateExpression.parse_var_or_const(cursor)
+        if not cursor.at_end():
+            raise ValueError("Expected END but found tokens: " + PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
         return expr
 
     @staticmethod
-    def parse_expression(tokens):
-        lhs, rest = PredicateExpression.parse_implication(tokens)
-        if len(rest) == 0:
-            expr = lhs
-        else:
-            expr = lhs
-            if rest[0].type == 'IFF':
-                expr, rest = PredicateExpression.parse_expression(rest[1:])
-                expr = IffExpression(lhs, expr)
-        return expr, rest
+    def parse_expression(cursor):
+        return _PARSER.parse_expression(cursor)
 
     @staticmethod
-    def parse_implication(tokens):
-        lhs, rest = PredicateExpression.parse_disjunction(tokens)
-        if len(rest) == 0:
-            expr = lhs
-        else:
-            expr = lhs
-            if rest[0].type == 'IMPLIES':
-                expr, rest = PredicateExpression.parse_implication(rest[1:])
-                expr = ImpliesExpression(lhs, expr)
-        return expr, rest
+    def parse_negation(cursor):
+        return _PARSER.parse_negation(cursor)
 
     @staticmethod
-    def parse_disjunction(tokens):
-        lhs, rest = PredicateExpression.parse_conjunction(tokens)
-        if len(rest) == 0:
-            expr = lhs
-        else:
-            expr = lhs
-            if rest[0].type == 'OR':
-                expr, rest = PredicateExpression.parse_disjunction(rest[1:])
-                expr = OrExpression(lhs, expr)
-        return expr, rest
-
-    @staticmethod
-    def parse_conjunction(tokens):
-        lhs, rest = PredicateExpression.parse_negation(tokens)
-        if len(rest) == 0:
-            expr = lhs
-        else:
-            expr = lhs
-            if rest[0].type == 'AND':
-                expr, rest = PredicateExpression.parse_conjunction(rest[1:])
-                expr = AndExpression(lhs, expr)
-        return expr, rest
-
-    @staticmethod
-    def parse_negation(tokens):
-        if len(tokens) > 0 and tokens[0].type == 'NOT':
-            rest = tokens
-            while True:
-                expr, rest = PredicateExpression.parse_negation(rest[1:])
-                expr = NotExpression(expr)
-                if len(rest) == 0 or rest[0].type != 'NOT':
-                    break
-        else:
-            expr, rest = PredicateExpression.parse_atom(tokens)
-        return expr, rest
+    def parse_atom(cursor):
+        return _PARSER.parse_atom(cursor)
 
     @staticmethod
-    def parse_atom(tokens):
-        if len(tokens) == 0:
+    def parse_atom_steps(cursor):
+        if cursor.at_end():
             raise ValueError("Expected an atom, but found EOF")
-        if len(tokens) >= 2 and tokens[0].type == 'LPAREN' and tokens[1].type in ['ALL', 'EXISTS']:
-            quantifier = tokens[1].type
+        if cursor.peek_type() == 'LPAREN' and cursor.peek_type(1) in ['ALL', 'EXISTS']:
+            quantifier = cursor.peek_type(1)
             variables = []
-            tokens = tokens[2:]
-            while len(tokens) > 0:
-                if tokens[0].type != 'VAR':
+            cursor.advance()
+            cursor.advance()
+            while not cursor.at_end():
+                if cursor.peek_type() != 'VAR':
                     raise ValueError("Expected a variable, but found: " +
-                                     PTk.PredicateTokenizer.stringify_tokens(tokens))
-                variables.append(VariableExpression(tokens[0].value))
-                tokens = tokens[1:]
-                if len(tokens) == 0 or tokens[0].type == 'RPAREN':
+                                     PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
+                variables.append(VariableExpression(cursor.advance().value))
+                if cursor.at_end() or cursor.peek_type() == 'RPAREN':
                     break
-                if tokens[0].type == 'COMMA':
-                    tokens = tokens[1:]
-            if len(tokens) == 0:
+                if cursor.peek_type() == 'COMMA':
+                    cursor.advance()
+            if cursor.at_end():
                 raise ValueError("Expected a ',' variable or ')', but found EOF")
-            tokens = tokens[1:]
-            expr, rest = PredicateExpression.parse_negation(tokens)
+            cursor.advance()
+            expr = yield _PARSER.negation_steps(cursor)
             for var in reversed(variables):
                 if quantifier == 'ALL':
                     expr = ForallExpression(var, expr)
                 else:
                     expr = ExistsExpression(var, expr)
-            return expr, rest
-        elif tokens[0].type == 'LPAREN' or tokens[0].type == 'LBRACKET':
-            right_delim = 'RPAREN' if tokens[0].type == 'LPAREN' else 'RBRACKET'
-            expr, rest = PredicateExpression.parse_expression(tokens[1:])
-            if len(rest) == 0:
+            return expr
+        elif cursor.peek_type() == 'LPAREN' or cursor.peek_type() == 'LBRACKET':
+            right_delim = 'RPAREN' if cursor.peek_type() == 'LPAREN' else 'RBRACKET'
+            cursor.advance()
+            expr = yield _PARSER.expression_steps(cursor)
+            if cursor.at_end():
                 if right_delim == 'RPAREN':
                     raise ValueError("Expected a ')', but found EOF")
                 else:
                     raise ValueError("Expected a ']', but found EOF")
-            if rest[0].type != right_delim:
+            if cursor.peek_type() != right_delim:
+                rest = PTk.PredicateTokenizer.stringify_tokens(cursor.rest())
                 if right_delim == 'RPAREN':
-                    raise ValueError("Expected a ')', but found: " + PTk.PredicateTokenizer.stringify_tokens(rest))
+                    raise ValueError("Expected a ')', but found: " + rest)
                 else:
-                    raise ValueError("Expected a ']', but found: " + PTk.PredicateTokenizer.stringify_tokens(rest))
-            return expr, rest[1:]
-        elif tokens[0].type == 'VAR':
-            pred = tokens[0].value
+                    raise ValueError("Expected a ']', but found: " + rest)
+            cursor.advance()
+            return expr
+        elif cursor.peek_type() == 'VAR':
+            pred = cursor.advance().value
             args = []
-            if len(tokens) == 0:
+            if cursor.at_end():
                 raise ValueError("Expected a '(', but found EOF")
-            tokens = tokens[1:]
-            if tokens[0].type != 'LPAREN':
-                raise ValueError("Expected a '(', but found: " + PTk.PredicateTokenizer.stringify_tokens(tokens))
-            tokens = tokens[1:]
-            while len(tokens) > 0:
-                arg, tokens = PredicateExpression.parse_var_or_const(tokens)
-                args.append(arg)
-                if len(tokens) == 0 or tokens[0].type == 'RPAREN':
+            if cursor.peek_type() != 'LPAREN':
+                raise ValueError("Expected a '(', but found: " +
+                                 PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
+            cursor.advance()
+            while not cursor.at_end():
+                args.append(PredicateExpression.parse_var_or_const(cursor))
+                if cursor.at_end() or cursor.peek_type() == 'RPAREN':
                     break
-                if tokens[0].type != 'COMMA':
+                if cursor.peek_type() != 'COMMA':
                     raise ValueError("Expected a ',' or ')', but found: " +
-                                     PTk.PredicateTokenizer.stringify_tokens(tokens))
-                tokens = tokens[1:]
-            if len(tokens) == 0:
+                                     PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
+                cursor.advance()
+            if cursor.at_end():
                 raise ValueError("Expected a ',' or ')', but found EOF")
-            return PredicateInstanceExpression(pred, args), tokens[1:]
-        elif tokens[0].type == 'PROP':
-            return LogicalConstantExpression(tokens[0].value), tokens[1:]
+            cursor.advance()
+            return PredicateInstanceExpression(pred, args)
+        elif cursor.peek_type() == 'PROP':
+            return LogicalConstantExpression(cursor.advance().value)
         else:
             raise ValueError("Expected a predicate or logical constant, but found: " +
-                             PTk.PredicateTokenizer.stringify_tokens(tokens))
+                             PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
 
     @staticmethod
-    def parse_var_or_const(tokens):
-        if tokens[0].type == 'VAR':
-            arg = VariableExpression(tokens[0].value)
-        elif tokens[0].type == 'CONST':
-            arg = NumericConstantExpression(tokens[0].value)
+    def parse_var_or_const(cursor):
+        if cursor.peek_type() == 'VAR':
+            arg = VariableExpression(cursor.advance().value)
+        elif cursor.peek_type() == 'CONST':
+            arg = NumericConstantExpression(cursor.advance().value)
         else:
             raise ValueError("Expected a variable or constant, but found: " +
-                             PTk.PredicateTokenizer.stringify_tokens(tokens))
-        return arg, tokens[1:]
+                             PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
+        return arg
 
     def collect_vars(self):
-        known_vars = set()
-        self.collect_vars_helper(known_vars)
-
-    def collect_vars_helper(self, known_vars):
-        for child in self.children():
-            child.collect_vars_helper(known_vars)
+        return self.free_vars | self.bound_vars
 
     def has_unique_vars(self):
-        known_vars = set()
-        return self.has_unique_vars_helper(known_vars)
-
-    def has_unique_vars_helper(self, known_vars):
-        for child in self.children():
-            if not child.has_unique_vars_helper(known_vars):
-                return False
-        return True
+        return self.unique_vars
 
     def contains(self, var):
-        for child in self.children():
-            if child.contains(var):
-                return True
-        return False
+        return var.value in self.free_vars or var.value in self.bound_vars
 
     def check_predicate_arities(self, arities):
-        for child in self.children():
-            child.check_predicate_arities(arities)
+        # Predicate instances are reached left to right, so the first conflicting use is the one reported
+        TF.fold(self, lambda node, _values, _context: node.arity_step(arities), PredicateExpression.subformulas)
+
+    @staticmethod
+    def subformulas(node):
+        return [child for child in node.children() if isinstance(child, PredicateExpression)]
+
+    def arity_step(self, arities):
+        pass
 
     # noinspection PyMethodMayBeStatic
     def children(self):
         return []
 
 
-class ObjectExpression:
+class ObjectExpression(metaclass=HC.HashConsed):
+    __slots__ = ("value", "structural_hash", "size", "depth", "free_vars", "bound_vars", "__weakref__")
+    outer_vars = frozenset()
+    unique_vars = True
+    arities = frozenset()
+
     def __init__(self, value):
         self.value = value
+        self.structural_hash = hash((type(self).__name__, value))
+        self.size = 1
+        self.depth = 1
+        self.free_vars = frozenset()
+        self.bound_vars = frozenset()
 
-    def match(self, other, _bindings):
+    def __hash__(self):
+        return self.structural_hash
+
+    def __reduce__(self):
+        return type(self), (self.value,)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, _memo):
+        return self
+
+    def match(self, other, bindings):
+        return self.match_step(other, bindings)
+
+    def match_step(self, other, _bindings):
         return self.equal(other)
 
-    def replace(self, _bindings):
+    def replace(self, bindings):
+        return self.replace_step((), bindings)
+
+    def replace_step(self, _values, _bindings):
         return self
 
-    def equal(self, other):
-        return isinstance(other, type(self)) and self.value == other.value
+    def close(self, name, depth=0):
+        return self.close_step((), name, depth)
 
-    def collect_vars_helper(self, known_vars):
-        return
+    def close_step(self, _values, _name, _depth):
+        return self
 
-    # noinspection PyMethodMayBeStatic
-    def has_unique_vars_helper(self, _known_vars):
-        return True
+    def equal(self, other):
+        return self is other
 
     def contains(self, var):
         return False
@@ -235,94 +294,93 @@ class ObjectExpression:
     def to_string(self, _level=0):
         return str(self.value)
 
+    def str_parts(self):
+        return [str(self.value)]
+
+    def to_string_parts(self, _level):
+        return [str(self.value)]
+
 
 class NumericConstantExpression(ObjectExpression):
-    def __init__(self, value):
-        super().__init__(value)
+    __slots__ = ()
 
 
 class VariableExpression(ObjectExpression):
-    def __init__(self, symbol):
-        super().__init__(symbol)
+    __slots__ = ()
 
-    def match(self, other, bindings):
+    def __init__(self, value):
+        super().__init__(value)
+        self.free_vars = frozenset([value])
+
+    def match_step(self, other, bindings):
         if self.value in bindings:
             return bindings[self.value].equal(other)
         bindings[self.value] = other
         return True
 
-    def replace(self, bindings):
+    def replace_step(self, _values, bindings):
         if self.value in bindings:
             return bindings[self.value]
         return self
 
-    def collect_vars_helper(self, known_vars):
-        for var in known_vars:
-            if self.equal(var):
-                return
-        known_vars.append(self)
+    def close_step(self, _values, name, depth):
+        if self.value == name:
+            return VariableExpression("#" + str(depth))
+        return self
 
     def contains(self, var):
         return self.equal(var)
 
 
 class LogicalConstantExpression(PredicateExpression):
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
+        self.init_structure(value, ())
 
-    def match(self, other, _bindings):
-        return self.equal(other)
-
-    def replace(self, _bindings):
-        return self
+    def __reduce__(self):
+        return LogicalConstantExpression, (self.value,)
 
-    def equal(self, other):
-        return isinstance(other, type(self)) and self.value == other.value
+    def match_step(self, other, _bindings):
+        return self.equal(other)
 
     # noinspection PyMethodMayBeStatic
     def children(self):
         return []
 
-    def __str__(self):
-        return str(self.value)
+    def str_parts(self):
+        return [str(self.value)]
 
-    def to_string(self, _level=0):
-        return str(self.value)
+    def to_string_parts(self, _level):
+        return [str(self.value)]
 
 
 class PredicateInstanceExpression(PredicateExpression):
+    __slots__ = ("predicate", "args")
+
     def __init__(self, predicate, args):
         self.predicate = predicate
         self.args = args
+        self.init_structure(predicate, args)
+        self.arities = frozenset([(predicate, len(args))])
 
-    def match(self, other, _bindings):
-        if isinstance(other, type(self)) and self.predicate == other.predicate and len(self.args) == len(other.args):
-            for i in range(len(self.args)):
-                if not self.args[i].match(other.args[i], _bindings):
-                    return False
-            return True
-        else:
-            return False
-
-    def replace(self, _bindings):
-        new_args = []
-        for arg in self.args:
-            new_args.append(arg.replace(_bindings))
-        return PredicateInstanceExpression(self.predicate, new_args)
+    def __reduce__(self):
+        return PredicateInstanceExpression, (self.predicate, self.args)
 
-    def equal(self, other):
+    def match_step(self, other, _bindings):
         if isinstance(other, type(self)) and self.predicate == other.predicate and len(self.args) == len(other.args):
-            for i in range(len(self.args)):
-                if not self.args[i].equal(other.args[i]):
-                    return False
-            return True
+            return list(zip(self.args, other.args))
         else:
             return False
 
+    def rebuild(self, values):
+        return PredicateInstanceExpression(self.predicate, list(values))
+
     def children(self):
         return self.args
 
-    def check_predicate_arities(self, arities):
+    def arity_step(self, arities):
         if self.predicate in arities:
             if len(self.args) != arities[self.predicate]:
                 raise ValueError(f"Predicate {self.predicate} is used with different number of arguments " +
@@ -336,158 +394,183 @@ class PredicateInstanceExpression(PredicateExpression):
             args.append(str(arg))
         return self.predicate + "(" + ",".join(args) + ")"
 
-    def to_string(self, _level=0):
-        return str(self)
+    def str_parts(self):
+        return [str(self)]
+
+    def to_string_parts(self, _level):
+        return [str(self)]
 
 
 class QuantifierExpression(PredicateExpression):
-    def __init__(self, quantifier, var, expr):
-        self.quantifier = quantifier
+    __slots__ = ("var", "expr")
+    quantifier = None
+
+    def __init__(self, var, expr):
         self.var = var
         self.expr = expr
+        self.init_structure(None, (var, expr))
+        self.free_vars = expr.free_vars - {var.value}
+        self.bound_vars = expr.bound_vars | {var.value}
+        self.outer_vars = frozenset([var.value])
+        self.unique_vars = True
 
-    def match(self, other, bindings):
+    def __reduce__(self):
+        return type(self), (self.var, self.expr)
+
+    def match_step(self, other, _bindings):
         if not isinstance(other, type(self)):
             return False
         if self.quantifier != other.quantifier:
             return False
-        new_bindings = copy.deepcopy(bindings)
-        new_bindings[self.var.value] = other.var
-        return self.expr.match(other.expr, bindings)
-
-    def replace(self, bindings):
-        new_bindings = copy.deepcopy(bindings)
-        new_bindings[self.var.value] = self.var
-        return (type(self))(self.var, self.expr.replace(new_bindings))
-
-    def equal(self, other):
-        return isinstance(other, type(self)) and \
-               self.quantifier == other.quantifier and \
-               self.var.equal(other.var) and \
-               self.expr.equal(other.expr)
-
-    def has_unique_vars_helper(self, known_vars):
-        if self.var.value in known_vars:
-            return False
-        known_vars.add(self.var.value)
-        return True
+        return [(self.expr, other.expr)]
 
-    def check_predicate_arities(self, arities):
-        self.expr.check_predicate_arities(arities)
+    def rebuild(self, values):
+        return (type(self))(self.var, values[1])
 
     def children(self):
         return [self.var, self.expr]
 
-    def __str__(self):
-        return "(" + self.quantifier + " " + str(self.var) + ")" + "(" + str(self.expr) + ")"
+    def str_parts(self):
+        return ["(" + self.quantifier + " " + str(self.var) + ")" + "(", (self.expr, 0), ")"]
 
-    def to_string(self, level=0):
+    def to_string_parts(self, level):
         prefix = "(" + self.quantifier + " " + str(self.var)
         expr = self.expr
         while isinstance(expr, type(self)) and self.quantifier == expr.quantifier:
             prefix += " " + str(expr.var)
             expr = expr.expr
         prefix += ")"
-        left = expr.to_string(10)
-        if left[0] != '(':
-            left = " " + left
+        left = [(expr, 10)]
+        if TF.leading_text(expr, lambda node, node_level: node.to_string_parts(node_level), 10)[0] != '(':
+            left = [" "] + left
         if level > 10:
-            return "(" + prefix + left + ")"
+            return ["(" + prefix] + left + [")"]
         else:
-            return prefix + left
+            return [prefix] + left
 
 
 class ForallExpression(QuantifierExpression):
-    def __init__(self, var, expr):
-        super().__init__("all", var, expr)
+    __slots__ = ()
+    quantifier = "all"
 
 
 class ExistsExpression(QuantifierExpression):
-    def __init__(self, var, expr):
-        super().__init__("some", var, expr)
+    __slots__ = ()
+    quantifier = "some"
 
 
 class NotExpression(PredicateExpression):
+    __slots__ = ("expr",)
+
     def __init__(self, expr):
         self.expr = expr
+        self.init_structure(None, (expr,))
 
-    def match(self, other, bindings):
-        return isinstance(other, NotExpression) and self.expr.match(other.expr, bindings)
+    def __reduce__(self):
+        return NotExpression, (self.expr,)
 
-    def replace(self, bindings):
-        return NotExpression(self.expr.replace(bindings))
+    def match_step(self, other, _bindings):
+        return isinstance(other, NotExpression) and [(self.expr, other.expr)]
 
-    def equal(self, other):
-        return isinstance(other, NotExpression) and self.expr.equal(other.expr)
+    def rebuild(self, values):
+        return NotExpression(values[0])
 
     def children(self):
         return [self.expr]
 
-    def __str__(self):
-        return "Not(" + str(self.expr) + ")"
+    def str_parts(self):
+        return ["Not(", (self.expr, 0), ")"]
 
-    def to_string(self, level=0):
-        left = self.expr.to_string(10)
+    def to_string_parts(self, level):
         if level > 10:
-            return "(~" + left + ")"
+            return ["(~", (self.expr, 10), ")"]
         else:
-            return "~" + left
+            return ["~", (self.expr, 10)]
 
 
 class BinaryExpression(PredicateExpression):
-    def __init__(self, opstr, op, level, lhs, rhs):
-        self.opstr = opstr
-        self.op = op
-        self.level = level
+    __slots__ = ("lhs", "rhs")
+    opstr = None
+    op = None
+    level = None
+
+    def __init__(self, lhs, rhs):
         self.lhs = lhs
         self.rhs = rhs
+        self.init_structure(None, (lhs, rhs))
 
-    def match(self, expr, bindings):
-        return isinstance(expr, type(self)) \
-               and self.lhs.match(expr.lhs, bindings) \
-               and self.rhs.match(expr.rhs, bindings)
+    def __reduce__(self):
+        return type(self), (self.lhs, self.rhs)
 
-    def replace(self, bindings):
-        return (type(self))(self.lhs.replace(bindings), self.rhs.replace(bindings))
+    def match_step(self, expr, _bindings):
+        return isinstance(expr, type(self)) and [(self.lhs, expr.lhs), (self.rhs, expr.rhs)]
 
-    def equal(self, other):
-        return isinstance(other, type(self)) \
-               and self.lhs.equal(other.lhs) \
-               and self.rhs.equal(other.rhs)
+    def rebuild(self, values):
+        return (type(self))(values[0], values[1])
 
     def children(self):
         return [self.lhs, self.rhs]
 
-    def __str__(self):
-        return self.opstr + "(" + str(self.lhs) + ", " + str(self.rhs) + ")"
+    def str_parts(self):
+        return [self.opstr + "(", (self.lhs, 0), ", ", (self.rhs, 0), ")"]
 
-    def to_string(self, level=0):
-        left = self.lhs.to_string(self.level + 1)
-        right = self.rhs.to_string(self.level)
+    def to_string_parts(self, level):
+        parts = [(self.lhs, self.level + 1), " " + self.op + " ", (self.rhs, self.level)]
         if level > self.level:
-            return "(" + left + " " + self.op + " " + right + ")"
+            return ["("] + parts + [")"]
         else:
-            return left + " " + self.op + " " + right
+            return parts
 
 
 class AndExpression(BinaryExpression):
-    def __init__(self, lhs, rhs):
-        super().__init__("And", "/\\", 8, lhs, rhs)
+    __slots__ = ()
+    opstr = "And"
+    op = "/\\"
+    level = 8
 
 
 class OrExpression(BinaryExpression):
-    def __init__(self, lhs, rhs):
-        super().__init__("Or", "\\/", 6, lhs, rhs)
+    __slots__ = ()
+    opstr = "Or"
+    op = "\\/"
+    level = 6
 
 
 class ImpliesExpression(BinaryExpression):
-    def __init__(self, lhs, rhs):
-        super().__init__("Implies", "==>", 4, lhs, rhs)
+    __slots__ = ()
+    opstr = "Implies"
+    op = "==>"
+    level = 4
 
 
 class IffExpression(BinaryExpression):
-    def __init__(self, lhs, rhs):
-        super().__init__("Iff", "<=>", 2, lhs, rhs)
+    __slots__ = ()
+    opstr = "Iff"
+    op = "<=>"
+    level = 2
+
+
+# Opcodes are positions in this list, so new classes go at the end to keep existing encodings readable
+PredicateExpression.codec = EC.ExpressionCodec(
+    [(LogicalConstantExpression, "A", (bool,)),
+     (NumericConstantExpression, "A", (int,)),
+     (VariableExpression, "A", (str,)),
+     (PredicateInstanceExpression, "AL", (str, ObjectExpression)),
+     (ForallExpression, "NN", (VariableExpression, PredicateExpression)),
+     (ExistsExpression, "NN", (VariableExpression, PredicateExpression)),
+     (NotExpression, "N", (PredicateExpression,)),
+     (AndExpression, "NN", (PredicateExpression, PredicateExpression)),
+     (OrExpression, "NN", (PredicateExpression, PredicateExpression)),
+     (ImpliesExpression, "NN", (PredicateExpression, PredicateExpression)),
+     (IffExpression, "NN", (PredicateExpression, PredicateExpression))])
+
+_PARSER = EP.ExpressionParser([('IFF', IffExpression),
+                               ('IMPLIES', ImpliesExpression),
+                               ('OR', OrExpression),
+                               ('AND', AndExpression)],
+                              NotExpression,
+                              PredicateExpression.parse_atom_steps)
+
 
 # expr1 = PredicateExpression.parse("(forall x) (forall y) (exists z) P(x, y, z) ==> (exists w) Q(x, w, z)")
 # print(expr1)
@@ -1,16 +1,13 @@
+import pred_check.BindingEnvironment as BEnv
 # import pred_check.PredicateExpression as PExp
 
 
 class PredicateMatcher:
     def __init__(self, bindings=None):
-        if bindings is None:
-            bindings = {}
-        self.bindings = bindings
+        self.bindings = BEnv.BindingEnvironment(bindings)
 
     def reset(self, bindings=None):
-        if bindings is None:
-            bindings = {}
-        self.bindings = bindings
+        self.bindings = BEnv.BindingEnvironment(bindings)
 
     def match(self, pattern, expr):
         return pattern.match(expr, self.bindings)
@@ -1,119 +1,181 @@
+import functools
+
 import pred_check.PredicateExpression as PExp
 import pred_check.PredicateMatcher as PMatch
 import pred_check.PredicateTokenizer as PTk
-import prop_check.PropositionalExpression as PropExp
+import prop_check.ExpressionParser as EP
+import prop_check.StepCache as SC
+import prop_check.TreeFold as TF
 
 _parse = PExp.PredicateExpression.parse
 
+_TRUTH_TABLE_MAX_ATOMS = 20
+
 
 class PredicateProof:
-    def __init__(self, goal):
+    def __init__(self, goal, cache=None):
         if isinstance(goal, str):
             goal = _parse(goal)
         self.goal = goal
+        self.cache = cache
         self.steps = []
 
     @staticmethod
-    def parse_eq_rhs_reason(tokens):
-        if tokens[0].type not in ['EQ', 'IMPLIEDBY']:
-            raise ValueError("Expected a '=' or '-|' , but found : " + PTk.PredicateTokenizer.stringify_tokens(tokens))
-        tokens = tokens[1:]
-        rhs, tokens = PExp.PredicateExpression.parse_expression(tokens)
-        if len(tokens) == 0:
+    def parse_eq_rhs_reason(cursor):
+        if cursor.peek_type() not in ['EQ', 'IMPLIEDBY']:
+            raise ValueError("Expected a '=' or '-|' , but found : " +
+                             PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
+        cursor.advance()
+        rhs = PExp.PredicateExpression.parse_expression(cursor)
+        if cursor.at_end():
             raise ValueError("Expected a '{', but found EOF")
-        if tokens[0].type != 'LBRACE':
-            raise ValueError("Expected a '{', but found : " + PTk.PredicateTokenizer.stringify_tokens(tokens))
-        tokens = tokens[1:]
-        if tokens[0].type == 'VAR' and tokens[0].value in ["rename", "migrate", "remove", "propositional"]:
-            if tokens[0].value == 'rename':
-                tokens = tokens[1:]
-                x = PredicateProof.expect_variable(tokens)
-                tokens = tokens[1:]
-                PredicateProof.expect_keyword(tokens, 'to')
-                tokens = tokens[1:]
-                y = PredicateProof.expect_variable(tokens)
-                tokens = tokens[1:]
+        if cursor.peek_type() != 'LBRACE':
+            raise ValueError("Expected a '{', but found : " + PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
+        cursor.advance()
+        if cursor.peek_type() == 'VAR' and \
+                cursor.peek().value in ["rename", "migrate", "remove", "propositional"]:
+            keyword = cursor.advance().value
+            if keyword == 'rename':
+                x = PredicateProof.expect_variable(cursor)
+                PredicateProof.expect_keyword(cursor, 'to')
+                y = PredicateProof.expect_variable(cursor)
                 reason = ('rename', x, y)
-            elif tokens[0].value in ['migrate', 'remove']:
-                keyword = tokens[0].value
-                tokens = tokens[1:]
-                reason = (keyword, PredicateProof.expect_variable(tokens))
-                tokens = tokens[1:]
+            elif keyword in ['migrate', 'remove']:
+                reason = (keyword, PredicateProof.expect_variable(cursor))
             else:
-                tokens = tokens[1:]
-                PredicateProof.expect_keyword(tokens, 'reasoning')
+                PredicateProof.expect_keyword(cursor, 'reasoning')
                 reason = ["propositional"]
-                tokens = tokens[1:]
         else:
             raise ValueError("Expected a logical step (rename, migrate, remove, or propositional reasoning), " +
-                             "but found: " + PTk.PredicateTokenizer.stringify_tokens(tokens))
-        if len(tokens) == 0:
+                             "but found: " + PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
+        if cursor.at_end():
             raise ValueError("Expected a '}', but found EOF")
-        if tokens[0].type != 'RBRACE':
-            raise ValueError("Expected a '}', but found : " + PTk.PredicateTokenizer.stringify_tokens(tokens))
-        tokens = tokens[1:]
-        return rhs, reason, tokens
+        if cursor.peek_type() != 'RBRACE':
+            raise ValueError("Expected a '}', but found : " + PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
+        cursor.advance()
+        return rhs, reason
 
     @staticmethod
-    def expect_keyword(tokens, keyword):
-        if len(tokens) == 0:
+    def expect_keyword(cursor, keyword):
+        if cursor.at_end():
             raise ValueError("Expected '" + keyword + "', but found EOF")
-        if not (tokens[0].type == 'VAR' and tokens[0].value == keyword):
+        if not (cursor.peek_type() == 'VAR' and cursor.peek().value == keyword):
             raise ValueError("Expected '" + keyword + "', but found : " +
-                             PTk.PredicateTokenizer.stringify_tokens(tokens))
+                             PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
+        cursor.advance()
 
     @staticmethod
-    def expect_variable(tokens):
-        if len(tokens) == 0:
+    def expect_variable(cursor):
+        if cursor.at_end():
             raise ValueError("Expected a variable, but found EOF")
-        if tokens[0].type != 'VAR':
+        if cursor.peek_type() != 'VAR':
             raise ValueError("Expected a variable, but found : " +
-                             PTk.PredicateTokenizer.stringify_tokens(tokens))
-        return PExp.VariableExpression(tokens[0].value)
+                             PTk.PredicateTokenizer.stringify_tokens(cursor.rest()))
+        return PExp.VariableExpression(cursor.advance().value)
 
     @staticmethod
     def parse_proof_script(script):
         tokenizer = PTk.PredicateProofTokenizer()
-        tokens = tokenizer.tokenize(script)
-        expr, tokens = PExp.PredicateExpression.parse_expression(tokens)
-        steps = [(expr, None)]
-        while len(tokens) > 0:
-            expr, name, tokens = PredicateProof.parse_eq_rhs_reason(tokens)
-            steps.append((expr, name))
+        return list(PredicateProof.iter_proof_steps(EP.TokenCursor(tokenizer.tokenize(script))))
+
+    @staticmethod
+    def iter_proof_script(source):
+        tokenizer = PTk.PredicateProofTokenizer()
+        return PredicateProof.iter_proof_steps(EP.StreamingTokenCursor(tokenizer.iter_tokens(source)))
+
+    @staticmethod
+    def iter_proof_steps(cursor):
+        yield PExp.PredicateExpression.parse_expression(cursor), None
+        while not cursor.at_end():
+            yield PredicateProof.parse_eq_rhs_reason(cursor)
+
+    @staticmethod
+    def steps_to_bytes(steps):
+        return PExp.PredicateExpression.codec.encode([tuple(step) for step in steps])
+
+    @staticmethod
+    def steps_from_bytes(data):
+        steps = PExp.PredicateExpression.codec.decode(data)
+        if not isinstance(steps, list):
+            raise ValueError("Encoded value is not a list of proof steps")
+        for i, step in enumerate(steps):
+            if (not isinstance(step, tuple) or len(step) != 2 or not isinstance(step[0], PExp.PredicateExpression)
+                    or not PredicateProof.is_reason(step[1])):
+                raise ValueError("Encoded proof step " + str(i) + " is not an (expression, reason) pair")
         return steps
 
+    @staticmethod
+    def is_reason(reason):
+        # The shapes parse_eq_rhs_reason builds, or None for the first step
+        if reason is None:
+            return True
+        if not isinstance(reason, (tuple, list)) or len(reason) == 0:
+            return False
+        if reason[0] == 'rename':
+            return len(reason) == 3 and all(isinstance(v, PExp.VariableExpression) for v in reason[1:])
+        if reason[0] in ['migrate', 'remove']:
+            return len(reason) == 2 and isinstance(reason[1], PExp.VariableExpression)
+        return list(reason) == ["propositional"]
+
     def check_proof(self, script=None):
         if script is not None:
             if isinstance(script, str):
                 self.steps = PredicateProof.parse_proof_script(script)
             else:
                 self.steps = script
+        return self.check_steps(self.steps)
+
+    def check_proof_stream(self, source):
+        return self.check_steps(PredicateProof.iter_proof_script(source))
+
+    def check_steps(self, steps):
         errors = []
-        if len(self.steps) == 0:
+        previous = None
+        count = 0
+        for expr, reason in steps:
+            count += 1
+            if count == 1:
+                if not expr.equal(self.goal):
+                    errors.append("Step 1: First step does not match the theorem you want to prove")
+            else:
+                error_msg = PredicateProof.check_step(count, previous, expr, reason, self.cache)
+                if error_msg is not None:
+                    errors.append(error_msg)
+            previous = expr
+        if self.cache is not None:
+            self.cache.flush()
+        if count == 0:
             errors.append("Proof is empty")
             return errors
-        if not self.steps[0][0].equal(self.goal):
-            errors.append("Step 1: First step does not match the theorem you want to prove")
-        for i in range(1, len(self.steps)):
-            error_msg = None
-            if self.steps[i - 1][0].equal(self.steps[i][0]):
-                errors.append("Step {} does nothing".format(i + 1))
-            elif self.steps[i][1][0] == 'rename':
-                old_var = self.steps[i][1][1]
-                new_var = self.steps[i][1][2]
-                error_msg = PredicateProof.check_rename(old_var, new_var, self.steps[i - 1][0], self.steps[i][0])
-            elif self.steps[i][1][0] == 'migrate':
-                error_msg, _ = PredicateProof.check_migrate(self.steps[i][1][1], self.steps[i - 1][0], self.steps[i][0])
-            elif self.steps[i][1][0] == 'remove':
-                error_msg = PredicateProof.check_remove(self.steps[i][1][1], self.steps[i - 1][0], self.steps[i][0])
-            else:
-                error_msg, _ = PredicateProof.check_propositional(self.steps[i - 1][0], self.steps[i][0])
-            if error_msg and error_msg is not True:
-                errors.append("Step {}: {}".format(i + 1, error_msg))
-        if not self.steps[-1][0].equal(PExp.LogicalConstantExpression(True)):
-            errors.append("Step {}: Last step should always be 'True'".format(len(self.steps)))
+        if not previous.equal(PExp.LogicalConstantExpression(True)):
+            errors.append("Step {}: Last step should always be 'True'".format(count))
         return errors
 
+    @staticmethod
+    def check_step(step, previous, expr, reason, cache=None):
+        if previous.equal(expr):
+            return "Step {} does nothing".format(step)
+        if cache is None:
+            error_msg = PredicateProof.check_reason(previous, expr, reason)
+        else:
+            key = SC.StepCache.make_key(*reason, previous, expr)
+            error_msg = cache.lookup(key, lambda: PredicateProof.check_reason(previous, expr, reason))
+        if error_msg and error_msg is not True:
+            return "Step {}: {}".format(step, error_msg)
+        return None
+
+    @staticmethod
+    def check_reason(previous, expr, reason):
+        if reason[0] == 'rename':
+            return PredicateProof.check_rename(reason[1], reason[2], previous, expr)
+        elif reason[0] == 'migrate':
+            error_msg, _ = PredicateProof.check_migrate(reason[1], previous, expr)
+            return error_msg
+        elif reason[0] == 'remove':
+            return PredicateProof.check_remove(reason[1], previous, expr)
+        error_msg, _ = PredicateProof.check_propositional(previous, expr)
+        return error_msg
+
     @staticmethod
     def check_rename(old_var, new_var, lhs, rhs):
         if old_var.equal(new_var):
@@ -124,87 +186,102 @@ class PredicateProof:
     def check_rename_step(old_var, new_var, lhs, rhs, diff=False):
         if lhs.equal(rhs):
             return None
-        if not isinstance(lhs, type(rhs)):
-            return "Result does not match prior step by renaming variables"
-        if isinstance(lhs, PExp.QuantifierExpression):
-            if lhs.var.equal(old_var) and rhs.var.equal(new_var):
-                if diff:
-                    return "Takes more than one step at a time"
-                if lhs.contains(new_var):
-                    return "A variable can only be renamed to a new variable name, not an existing variable name"
-                expected_rhs = lhs.expr.replace({lhs.var.value: rhs.var})
-                if expected_rhs.equal(rhs.expr):
-                    return True
+        # Pairs of subformulas are compared left to right on an explicit stack, stopping at the first error
+        pending = [(lhs, rhs)]
+        while len(pending) > 0:
+            lhs, rhs = pending.pop()
+            if lhs.equal(rhs):
+                continue
+            if not isinstance(lhs, type(rhs)):
                 return "Result does not match prior step by renaming variables"
-        for lhs_i, rhs_i in zip(lhs.children(), rhs.children()):
-            error_msg = PredicateProof.check_rename_step(old_var, new_var, lhs_i, rhs_i, diff)
-            if error_msg and error_msg is not True:
-                return error_msg
+            if isinstance(lhs, PExp.QuantifierExpression):
+                if lhs.var.equal(old_var) and rhs.var.equal(new_var):
+                    if diff:
+                        return "Takes more than one step at a time"
+                    if lhs.contains(new_var):
+                        return "A variable can only be renamed to a new variable name, not an existing variable name"
+                    if lhs.expr.close(lhs.var.value).equal(rhs.expr.close(rhs.var.value)):
+                        continue
+                    return "Result does not match prior step by renaming variables"
+            pending.extend(reversed(list(zip(lhs.children(), rhs.children()))))
         return True
 
     @staticmethod
     def check_migrate(old_var, lhs, rhs, diff=False):
-        if lhs.equal(rhs):
-            return None, diff
-        if not lhs.has_unique_vars():
-            return "Cannot migrate quantifiers until all quantified variables are uniquely renamed", diff
-        if isinstance(rhs, PExp.QuantifierExpression) and rhs.var.equal(old_var):
-            lhs, rhs = rhs, lhs
-        if isinstance(lhs, PExp.QuantifierExpression) and lhs.var.equal(old_var):
-            if isinstance(rhs, PExp.QuantifierExpression):
-                if lhs.var.equal(rhs.var):
-                    return PredicateProof.check_migrate(old_var, lhs.expr, rhs.expr, diff)
-                if diff:
-                    return "Takes more than one step at a time", True
-                if not isinstance(rhs, type(lhs)):
-                    return "Cannot migrate a quantifier past a different quantifier", True
-                lhs1 = lhs.expr
-                rhs1 = rhs.expr
-                if not (isinstance(lhs1, type(lhs)) and isinstance(rhs1, type(lhs)) and
-                        lhs1.var.equal(rhs.var) and rhs1.var.equal(lhs.var)):
-                    return "Result does not match prior step by migrating quantifier", True
-                return PredicateProof.check_migrate(old_var, lhs1.expr, rhs1.expr, True)
-            elif isinstance(rhs, PExp.NotExpression):
-                lhs1 = lhs.expr
-                rhs1 = rhs.expr
-                if not (isinstance(lhs1, PExp.NotExpression) and isinstance(rhs1, PExp.QuantifierExpression)):
-                    return "Result does not match prior step by migrating quantifier", True
-                if isinstance(rhs1, type(lhs)):
-                    return "Migrating quantifier past negation should flip quantifier", True
-                return PredicateProof.check_migrate(old_var, lhs1.expr, rhs1.expr, True)
-            elif isinstance(rhs, PExp.BinaryExpression):
-                lhs1 = lhs.expr
-                rhs1a = rhs.lhs
-                rhs1b = rhs.rhs
-                if not isinstance(lhs1, type(rhs)):
-                    return "Result does not match prior step by migrating quantifier", True
-                if isinstance(rhs1a, PExp.QuantifierExpression) and rhs1a.var.equal(lhs.var):
-                    if isinstance(rhs1a, type(lhs)):
-                        if isinstance(rhs, PExp.ImpliesExpression):
-                            return "Migrating quantifier past hypothesis of implication should flip quantifier", True
-                    else:
-                        if not isinstance(rhs, PExp.ImpliesExpression):
+        # Pairs still to compare sit on an explicit stack, in order, each with the diff it starts from; None there
+        # continues from the diff left by the previous pair. A None entry marks the end of a node's children.
+        pending = [(lhs, rhs, diff)]
+        result = None
+        while len(pending) > 0:
+            item = pending.pop()
+            if item is None:
+                result = True
+                continue
+            lhs, rhs, pair_diff = item
+            if pair_diff is not None:
+                diff = pair_diff
+            if lhs.equal(rhs):
+                result = None
+                continue
+            if not lhs.has_unique_vars():
+                return "Cannot migrate quantifiers until all quantified variables are uniquely renamed", diff
+            if isinstance(rhs, PExp.QuantifierExpression) and rhs.var.equal(old_var):
+                lhs, rhs = rhs, lhs
+            if isinstance(lhs, PExp.QuantifierExpression) and lhs.var.equal(old_var):
+                if isinstance(rhs, PExp.QuantifierExpression):
+                    if lhs.var.equal(rhs.var):
+                        pending.append((lhs.expr, rhs.expr, None))
+                        continue
+                    if diff:
+                        return "Takes more than one step at a time", True
+                    if not isinstance(rhs, type(lhs)):
+                        return "Cannot migrate a quantifier past a different quantifier", True
+                    lhs1 = lhs.expr
+                    rhs1 = rhs.expr
+                    if not (isinstance(lhs1, type(lhs)) and isinstance(rhs1, type(lhs)) and
+                            lhs1.var.equal(rhs.var) and rhs1.var.equal(lhs.var)):
+                        return "Result does not match prior step by migrating quantifier", True
+                    pending.append((lhs1.expr, rhs1.expr, True))
+                    continue
+                elif isinstance(rhs, PExp.NotExpression):
+                    lhs1 = lhs.expr
+                    rhs1 = rhs.expr
+                    if not (isinstance(lhs1, PExp.NotExpression) and isinstance(rhs1, PExp.QuantifierExpression)):
+                        return "Result does not match prior step by migrating quantifier", True
+                    if isinstance(rhs1, type(lhs)):
+                        return "Migrating quantifier past negation should flip quantifier", True
+                    pending.append((lhs1.expr, rhs1.expr, True))
+                    continue
+                elif isinstance(rhs, PExp.BinaryExpression):
+                    lhs1 = lhs.expr
+                    rhs1a = rhs.lhs
+                    rhs1b = rhs.rhs
+                    if not isinstance(lhs1, type(rhs)):
+                        return "Result does not match prior step by migrating quantifier", True
+                    if isinstance(rhs1a, PExp.QuantifierExpression) and rhs1a.var.equal(lhs.var):
+                        if isinstance(rhs1a, type(lhs)):
+                            if isinstance(rhs, PExp.ImpliesExpression):
+                                return ("Migrating quantifier past hypothesis of implication should flip quantifier",
+                                        True)
+                        else:
+                            if not isinstance(rhs, PExp.ImpliesExpression):
+                                return "Migrating quantifier past logical connective should not flip quantifier", True
+                        pending.append((lhs1.rhs, rhs1b, True))
+                        pending.append((lhs1.lhs, rhs1a.expr, True))
+                        continue
+                    elif isinstance(rhs1b, PExp.QuantifierExpression) and rhs1b.var.equal(lhs.var):
+                        if not isinstance(rhs1b, type(lhs)):
                             return "Migrating quantifier past logical connective should not flip quantifier", True
-                    error_msg, diff = PredicateProof.check_migrate(old_var, lhs1.lhs, rhs1a.expr, True)
-                    if error_msg and error_msg is not True:
-                        return error_msg, True
-                    return PredicateProof.check_migrate(old_var, lhs1.rhs, rhs1b, True)
-                elif isinstance(rhs1b, PExp.QuantifierExpression) and rhs1b.var.equal(lhs.var):
-                    if not isinstance(rhs1b, type(lhs)):
-                        return "Migrating quantifier past logical connective should not flip quantifier", True
-                    error_msg, diff = PredicateProof.check_migrate(old_var, lhs1.rhs, rhs1b.expr, True)
-                    if error_msg and error_msg is not True:
-                        return error_msg
-                    return PredicateProof.check_migrate(old_var, lhs1.lhs, rhs1a, True)
-            else:
-                return "Result does not match prior step by migrating quantifier", True
-        if not isinstance(rhs, type(lhs)):
-            return "Result does not match prior step by migrating quantifier", diff
-        for lhs_i, rhs_i in zip(lhs.children(), rhs.children()):
-            error_msg, diff = PredicateProof.check_migrate(old_var, lhs_i, rhs_i, diff)
-            if error_msg and error_msg is not True:
-                return error_msg, diff
-        return True, diff
+                        pending.append((lhs1.lhs, rhs1a, True))
+                        pending.append((lhs1.rhs, rhs1b.expr, True))
+                        continue
+                else:
+                    return "Result does not match prior step by migrating quantifier", True
+            if not isinstance(rhs, type(lhs)):
+                return "Result does not match prior step by migrating quantifier", diff
+            pending.append(None)
+            pending.extend(reversed([(lhs_i, rhs_i, None) for lhs_i, rhs_i in zip(lhs.children(), rhs.children())]))
+        return result, diff
 
     @staticmethod
     def check_remove(old_var, lhs, rhs):
@@ -228,49 +305,89 @@ class PredicateProof:
 
     @staticmethod
     def check_propositional(lhs, rhs, diff=False):
-        if not isinstance(rhs, type(lhs)):
-            return PredicateProof.is_tautology(lhs, rhs), True
-        if isinstance(lhs, PExp.PredicateInstanceExpression):
-            if lhs.equal(rhs):
-                return None, diff
-            return "Resulting expression is not propositionally equivalent to prior step, e.g. when\n" + \
-                   lhs.to_string() + " is True and " + rhs.to_string() + " is False", \
-                   diff
-        if isinstance(lhs, PExp.LogicalConstantExpression):
-            if lhs.equal(rhs):
-                return None, diff
-            return "Resulting expression is not propositionally equivalent to prior since constant True is not False", \
-                   diff
-        if isinstance(lhs, PExp.QuantifierExpression):
-            if not lhs.var.equal(rhs.var):
-                return "Resulting expression is not propositionally equivalent to prior " + \
-                       "since quantifiers with different variables are never propositionally equivalent", \
-                       diff
-            return PredicateProof.check_propositional(lhs.expr, rhs.expr, diff)
-        for lhs_i, rhs_i in zip(lhs.children(), rhs.children()):
-            error_msg, diff = PredicateProof.check_propositional(lhs_i, rhs_i, diff)
-            if error_msg and error_msg is not True:
-                return error_msg, diff
+        # Pairs of subformulas are compared left to right on an explicit stack. A tautology result (True) only
+        # ends the check when no connective has been entered yet, i.e. it is the answer for the whole formula.
+        pending = [(lhs, rhs)]
+        nested = False
+        while len(pending) > 0:
+            lhs, rhs = pending.pop()
+            if not isinstance(rhs, type(lhs)):
+                error_msg = PredicateProof.is_tautology(lhs, rhs)
+                diff = True
+                if error_msg is not True or not nested:
+                    return error_msg, diff
+            elif isinstance(lhs, PExp.PredicateInstanceExpression):
+                if not lhs.equal(rhs):
+                    return "Resulting expression is not propositionally equivalent to prior step, e.g. when\n" + \
+                           lhs.to_string() + " is True and " + rhs.to_string() + " is False", \
+                           diff
+            elif isinstance(lhs, PExp.LogicalConstantExpression):
+                if not lhs.equal(rhs):
+                    return "Resulting expression is not propositionally equivalent to prior since constant True " + \
+                           "is not False", diff
+            elif isinstance(lhs, PExp.QuantifierExpression):
+                if not lhs.var.equal(rhs.var):
+                    return "Resulting expression is not propositionally equivalent to prior " + \
+                           "since quantifiers with different variables are never propositionally equivalent", \
+                           diff
+                pending.append((lhs.expr, rhs.expr))
+            else:
+                nested = True
+                pending.extend(reversed(list(zip(lhs.children(), rhs.children()))))
         return None, diff
 
     @staticmethod
-    def is_tautology(lhs, rhs):
+    def is_tautology(lhs, rhs, strategy=None):
+        # The propositional engine is imported on first use, so proofs without propositional steps never load it
+        import prop_check.PropositionalExpression as PropExp
         pred_to_prop = {}
         prop_to_pred = {}
         lhs_prop = PredicateProof.convert_to_prop(lhs, pred_to_prop, prop_to_pred)
         rhs_prop = PredicateProof.convert_to_prop(rhs, pred_to_prop, prop_to_pred)
         prop = PropExp.IffExpression(lhs_prop, rhs_prop)
-        bindings = {}
-        return PredicateProof._is_tautology(prop, prop_to_pred, list(prop_to_pred.keys()), bindings)
+        var_names = list(prop_to_pred.keys())
+        if strategy is None:
+            strategy = "truth-table" if len(var_names) <= _TRUTH_TABLE_MAX_ATOMS else "sat"
+        if strategy == "truth-table":
+            bindings = prop.find_falsifying_bindings(var_names)
+        elif strategy == "sat":
+            import prop_check.PropositionalSatSolver as PropSat
+            bindings = PropSat.PropositionalSatSolver.find_falsifying_bindings(prop, var_names)
+        elif strategy == "bdd":
+            bindings = PredicateProof.shared_bdd().find_falsifying_bindings(prop, var_names)
+        else:
+            raise ValueError("Unknown tautology checking strategy: " + str(strategy))
+        if bindings is None:
+            return True
+        return PredicateProof.create_error_msg_for_bindings(bindings, prop_to_pred)
+
+    @staticmethod
+    @functools.cache
+    def shared_bdd():
+        # One BDD per process, so its unique table is shared by every submission graded in a batch. It lives as long
+        # as the worker, so it relies on max_nodes to reset a table that outgrows ~20 MB.
+        import prop_check.PropositionalBdd as PropBdd
+        return PropBdd.PropositionalBdd()
 
     @staticmethod
     def convert_to_prop(expr, pred_to_prop, prop_to_pred):
+        return TF.fold(expr, lambda node, children, _context: PredicateProof.convert_node_to_prop(
+                            node, children, pred_to_prop, prop_to_pred),
+                       PredicateProof.propositional_children)
+
+    @staticmethod
+    def propositional_children(expr):
+        if isinstance(expr, (PExp.NotExpression, PExp.BinaryExpression)):
+            return expr.children()
+        return ()
+
+    @staticmethod
+    def convert_node_to_prop(expr, children, pred_to_prop, prop_to_pred):
+        import prop_check.PropositionalExpression as PropExp
         if isinstance(expr, PExp.NotExpression):
-            child = PredicateProof.convert_to_prop(expr.expr, pred_to_prop, prop_to_pred)
-            return PropExp.NotExpression(child)
+            return PropExp.NotExpression(children[0])
         if isinstance(expr, PExp.BinaryExpression):
-            child1 = PredicateProof.convert_to_prop(expr.lhs, pred_to_prop, prop_to_pred)
-            child2 = PredicateProof.convert_to_prop(expr.rhs, pred_to_prop, prop_to_pred)
+            child1, child2 = children
             if isinstance(expr, PExp.AndExpression):
                 return PropExp.AndExpression(child1, child2)
             if isinstance(expr, PExp.OrExpression):
@@ -290,19 +407,6 @@ class PredicateProof:
             prop_to_pred["p" + str(n)] = pred
         return pred_to_prop[pred]
 
-    @staticmethod
-    def _is_tautology(prop, prop_to_pred, var_names, bindings):
-        if len(var_names) == 0:
-            if prop.eval(bindings):
-                return True
-            return PredicateProof.create_error_msg_for_bindings(bindings, prop_to_pred)
-        bindings[var_names[0]] = True
-        error_msg = PredicateProof._is_tautology(prop, prop_to_pred, var_names[1:], bindings)
-        if error_msg and error_msg is not True:
-            return error_msg
-        bindings[var_names[0]] = False
-        return PredicateProof._is_tautology(prop, prop_to_pred, var_names[1:], bindings)
-
     @staticmethod
     def create_error_msg_for_bindings(bindings, prop_to_pred):
         error_msg = "Resulting expression is not propositionally equivalent to prior step, e.g. when"
@@ -36,50 +36,106 @@ _EXTRA_TOKENS = [Token('LBRACE', '{'),
                  ]
 
 
+_PATTERNS = {}
+
+
+def _compile_pattern(tokens):
+    values = tuple(sorted((token.value for token in tokens), key=len, reverse=True))
+    if values not in _PATTERNS:
+        _PATTERNS[values] = re.compile("(?P<SPACE>\\s+)" +
+                                       "|(?P<OP>" + "|".join(re.escape(value) for value in values) + ")" +
+                                       "|(?P<WORD>[a-zA-Z_][a-zA-Z0-9_]*)" +
+                                       "|(?P<CONST>[0-9]+)" +
+                                       "|(?P<ERROR>.)", re.DOTALL)
+    return _PATTERNS[values]
+
+
+_compile_pattern(_BASE_TOKENS)
+_compile_pattern(_BASE_TOKENS + _EXTRA_TOKENS)
+
+
 class PredicateTokenizer:
     def __init__(self, tokens=None):
         if tokens is None:
             tokens = _BASE_TOKENS
         self.tokens = sorted(tokens, key=lambda token: len(token.value), reverse=True)
+        self.operators = {token.value: token for token in self.tokens}
+        self.pattern = _compile_pattern(self.tokens)
 
-    def tokenize(self, expr):
-        var_re = re.compile("[a-zA-Z_][a-zA-Z0-9_]*")
-        const_re = re.compile("[0-9]+")
-        tokens = []
-        s = expr.replace("\\\\", "\\").lower()
+    @staticmethod
+    def describe_position(s, pos, first_line=1, first_column=0):
+        # first_column counts the characters of the first line of s that came before s itself
+        line_start = s.rfind("\n", 0, pos) + 1
+        line = first_line + s.count("\n", 0, pos)
+        column = pos - line_start + 1 + (first_column if line_start == 0 else 0)
+        return "line {}, column {}".format(line, column)
+
+    @staticmethod
+    def raw_position(raw, pos):
+        # Position in raw of position pos in raw.replace("\\\\", "\\"), which keeps one character of each pair
+        shift = 0
+        start = 0
         while True:
-            s = s.lstrip()
-            if s == "":
-                break
-            for token in self.tokens:
-                if s.startswith(token.value):
-                    tokens.append(token)
-                    s = s[len(token.value):]
-                    break
+            pair = raw.find("\\\\", start)
+            if pair < 0 or pair - shift >= pos:
+                return pos + shift
+            shift += 1
+            start = pair + 2
+
+    def tokenize(self, expr):
+        return list(self.iter_tokens(expr))
+
+    def iter_tokens(self, source):
+        # source is a string or any iterable of string chunks, split anywhere. No token spans whitespace, so each chunk
+        # is tokenized up to its last whitespace and the rest is carried into the next one.
+        if isinstance(source, str):
+            yield from self.iter_chunk_tokens(source, 1, 0)
+            return
+        line = 1
+        column = 0
+        tail = ""
+        for chunk in source:
+            text = tail + chunk
+            cut = max(text.rfind(space) for space in " \t\r\n") + 1
+            if cut == 0:
+                tail = text
+                continue
+            tail = text[cut:]
+            text = text[:cut]
+            yield from self.iter_chunk_tokens(text, line, column)
+            newlines = text.count("\n")
+            if newlines > 0:
+                line += newlines
+                column = len(text) - (text.rfind("\n") + 1)
             else:
-                m = var_re.match(s)
-                if m:
-                    word = s[m.start():m.end()]
-                    if word == "true":
-                        tokens.append(Token('PROP', True))
-                    elif word == "false":
-                        tokens.append(Token('PROP', False))
-                    elif word in ["forall", "all"]:
-                        tokens.append(Token('ALL', word))
-                    elif word in ["exists", "some"]:
-                        tokens.append(Token('EXISTS', word))
-                    else:
-                        tokens.append(Token('VAR', word))
-                    s = s[m.end():]
+                column += len(text)
+        if tail != "":
+            yield from self.iter_chunk_tokens(tail, line, column)
+
+    def iter_chunk_tokens(self, chunk, first_line, first_column):
+        s = chunk.replace("\\\\", "\\").lower()
+        for m in self.pattern.finditer(s):
+            kind = m.lastgroup
+            if kind == 'OP':
+                yield self.operators[m.group()]
+            elif kind == 'WORD':
+                word = m.group()
+                if word == "true":
+                    yield Token('PROP', True)
+                elif word == "false":
+                    yield Token('PROP', False)
+                elif word in ["forall", "all"]:
+                    yield Token('ALL', word)
+                elif word in ["exists", "some"]:
+                    yield Token('EXISTS', word)
                 else:
-                    m = const_re.match(s)
-                    if m:
-                        word = int(s[m.start():m.end()])
-                        tokens.append(Token('CONST', word))
-                        s = s[m.end():]
-                    else:
-                        raise ValueError("Unexpected token starting at: " + s)
-        return tokens
+                    yield Token('VAR', word)
+            elif kind == 'CONST':
+                yield Token('CONST', int(m.group()))
+            elif kind == 'ERROR':
+                pos = PredicateTokenizer.raw_position(chunk, m.start())
+                position = PredicateTokenizer.describe_position(chunk, pos, first_line, first_column)
+                raise ValueError("Unexpected token starting at " + position + ": " + s[m.start():])
 
     @staticmethod
     def stringify_tokens(tokens):
@@ -1,12 +1,25 @@
 import json
+import os
 from urllib.parse import parse_qs
 import base64
-import traceback
+import pred_check.PredicateExpression as PredExp
 import pred_check.PredicateProofChecker as PredChecker
+import prop_check.BatchGrader as BG
+import prop_check.StepCache as SC
 
+_STEP_CACHE = None
 
-def get_arg(event, args, name):
-    arg = ""
+
+def get_step_cache():
+    # Opened on first use in each process, so forked grader workers never share their parent's sqlite3 connection
+    global _STEP_CACHE
+    if _STEP_CACHE is None or _STEP_CACHE.pid != os.getpid():
+        _STEP_CACHE = SC.StepCache(path=os.environ.get("STEP_CACHE_DB"))
+    return _STEP_CACHE
+
+
+def get_arg(event, args, name, default=""):
+    arg = default
     if name in event:
         arg = event[name]
     elif name in args:
@@ -14,6 +27,19 @@ def get_arg(event, args, name):
     return arg
 
 
+_FIELDS = ("goal", "proof")
+
+
+def check_submission(values, cache):
+    proof = PredChecker.PredicateProof(BG.cached(cache, "goal", values["goal"], PredExp.PredicateExpression.parse),
+                                       cache=get_step_cache())
+    return proof.check_proof(values["proof"])
+
+
+def grade_submission(submission, cache):
+    return BG.grade_submission(submission, _FIELDS, lambda values: check_submission(values, cache))
+
+
 def lambda_handler(event, _context):
     # noinspection PyBroadException,PyBroadException
     try:
@@ -23,10 +49,13 @@ def lambda_handler(event, _context):
             if "isBase64Encoded" in event and event["isBase64Encoded"]:
                 body = base64.b64decode(body).decode("utf-8")
             args = parse_qs(body)
+        submissions = get_arg(event, args, "submissions", None)
+        if submissions is not None:
+            return BG.batch_response(submissions, grade_submission)
         proof_script = get_arg(event, args, "proof")
         goal = get_arg(event, args, "goal")
 
-        proof = PredChecker.PredicateProof(goal)
+        proof = PredChecker.PredicateProof(goal, cache=get_step_cache())
         errors = proof.check_proof(proof_script)
 
         return {
@@ -36,6 +65,7 @@ def lambda_handler(event, _context):
                                 "errors": errors})
         }
     except Exception:
+        import traceback
         return {
             'statusCode': 500,
             'body': json.dumps({"exception": traceback.format_exc()})
@@ -0,0 +1,43 @@
+import prop_check.PropositionalExpression as PExp
+
+
+class AxiomIndex:
+    def __init__(self, axioms, depth=2):
+        self.depth = depth
+        self.shapes = {}
+        self.attempted = 0
+        self.pruned = 0
+        for lhs, rhs in axioms.values():
+            self.shape_of(lhs)
+            self.shape_of(rhs)
+
+    def shape_of(self, pattern):
+        if pattern not in self.shapes:
+            self.shapes[pattern] = AxiomIndex.shape(pattern, self.depth)
+        return self.shapes[pattern]
+
+    @staticmethod
+    def shape(pattern, depth):
+        # Pattern variables and everything below the cut-off depth are wildcards (None)
+        if depth == 0 or isinstance(pattern, PExp.VariableExpression):
+            return None
+        if isinstance(pattern, PExp.ConstantExpression):
+            return PExp.ConstantExpression, pattern.value
+        return (type(pattern),) + tuple(AxiomIndex.shape(child, depth - 1) for child in pattern.children())
+
+    @staticmethod
+    def fits(shape, expr):
+        if shape is None:
+            return True
+        if type(expr) is not shape[0]:
+            return False
+        if shape[0] is PExp.ConstantExpression:
+            return expr.value == shape[1]
+        return all(AxiomIndex.fits(child_shape, child) for child_shape, child in zip(shape[1:], expr.children()))
+
+    def may_match(self, pattern, expr):
+        self.attempted += 1
+        if AxiomIndex.fits(self.shape_of(pattern), expr):
+            return True
+        self.pruned += 1
+        return False
@@ -0,0 +1,53 @@
+import json
+import time
+
+
+def cached(cache, kind, text, parse):
+    key = (kind, text)
+    if key not in cache:
+        cache[key] = parse(text)
+    return cache[key]
+
+
+def grade_submission(submission, fields, check):
+    # fields names the submission's text fields, echoed in the result in this order; check(values) returns the errors
+    result = {}
+    start = time.perf_counter()
+    # noinspection PyBroadException
+    try:
+        if not isinstance(submission, dict):
+            raise ValueError("Submission must be a JSON object, not " + type(submission).__name__)
+        values = {name: submission.get(name, "") for name in fields}
+        result.update(values)
+        result["errors"] = check(values)
+    except Exception:
+        import traceback
+        result["exception"] = traceback.format_exc()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def grade_batch(submissions, grade):
+    if isinstance(submissions, str):
+        submissions = json.loads(submissions)
+    if not isinstance(submissions, list):
+        raise ValueError("Submissions must be a JSON array of submission objects")
+    cache = {}
+    start = time.perf_counter()
+    results = [grade(submission, cache) for submission in submissions]
+    return {"results": results,
+            "seconds": time.perf_counter() - start}
+
+
+def batch_response(submissions, grade):
+    try:
+        batch = grade_batch(submissions, grade)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({"exception": str(e)})
+        }
+    return {
+        'statusCode': 200,
+        'body': json.dumps(batch)
+    }
@@ -0,0 +1,53 @@
+import prop_check.PropositionalExpression as PExp
+
+_VALUES = "values"
+
+
+class DiscriminationTree:
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    @staticmethod
+    def symbol(expr):
+        if isinstance(expr, PExp.VariableExpression):
+            return PExp.VariableExpression, expr.symbol
+        if isinstance(expr, PExp.ConstantExpression):
+            return PExp.ConstantExpression, expr.value
+        return type(expr)
+
+    @staticmethod
+    def preorder(expr):
+        terms = []
+        stack = [expr]
+        while stack:
+            term = stack.pop()
+            terms.append(term)
+            stack.extend(reversed(term.children()))
+        return terms
+
+    def insert(self, pattern, value):
+        node = self.root
+        for term in DiscriminationTree.preorder(pattern):
+            # Pattern variables become the wildcard edge (None), which skips a whole subterm on retrieval
+            key = None if isinstance(term, PExp.VariableExpression) else DiscriminationTree.symbol(term)
+            node = node.setdefault(key, {})
+        node.setdefault(_VALUES, []).append(value)
+        self.size += 1
+
+    def retrieve(self, expr):
+        terms = DiscriminationTree.preorder(expr)
+        results = []
+        stack = [(self.root, 0)]
+        while stack:
+            node, i = stack.pop()
+            if i == len(terms):
+                results.extend(node.get(_VALUES, ()))
+                continue
+            wildcard = node.get(None)
+            if wildcard is not None:
+                stack.append((wildcard, i + terms[i].size))
+            child = node.get(DiscriminationTree.symbol(terms[i]))
+            if child is not None:
+                stack.append((child, i + 1))
+        return results
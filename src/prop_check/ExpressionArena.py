@@ -0,0 +1,154 @@
+from array import array
+
+import prop_check.TreeFold as TF
+
+
+class ExpressionArena:
+    def __init__(self, codec):
+        # Node i is the class codec.classes[ops[i]] with operands args[arg_starts[i]:arg_starts[i + 1]], following the
+        # codec's kinds: a symbol id for "A", a node index for "N", and a count then node indices for "L"
+        self.codec = codec
+        self.positions = {cls: i for i, cls in enumerate(codec.classes)}
+        self.ops = array('i')
+        self.arg_starts = array('i', [0])
+        self.args = array('i')
+        self.symbols = []
+        self.symbol_ids = {}
+        # (class position, operands) -> node index, so a node is stored once however many expressions share it
+        self.node_ids = {}
+
+    def __len__(self):
+        return len(self.ops)
+
+    def nbytes(self):
+        return sum(column.itemsize * len(column) for column in (self.ops, self.arg_starts, self.args))
+
+    def symbol_id(self, atom):
+        key = (type(atom), atom)
+        if key not in self.symbol_ids:
+            self.symbol_ids[key] = len(self.symbols)
+            self.symbols.append(atom)
+        return self.symbol_ids[key]
+
+    def add(self, expr):
+        return ArenaExpression(self, TF.fold(expr, lambda node, indices, _context: self.append_node(node, indices),
+                                             self.codec.node_children))
+
+    def append_node(self, node, child_indices):
+        position = self.positions[type(node)]
+        children = iter(child_indices)
+        operands = []
+        for kind, arg in zip(self.codec.kinds[position], node.__reduce__()[1]):
+            if kind == "A":
+                operands.append(self.symbol_id(arg))
+            elif kind == "N":
+                operands.append(next(children))
+            else:
+                operands.append(len(arg))
+                operands.extend(next(children) for _ in arg)
+        key = (position, tuple(operands))
+        index = self.node_ids.get(key)
+        if index is None:
+            index = len(self.ops)
+            self.args.extend(operands)
+            self.ops.append(position)
+            self.arg_starts.append(len(self.args))
+            self.node_ids[key] = index
+        return index
+
+    def node(self, index):
+        return ArenaExpression(self, index)
+
+    def operands(self, index):
+        # (kind, value) pairs, with a symbol for "A", a node index for "N" and a list of node indices for "L"
+        args = self.args
+        pos = self.arg_starts[index]
+        operands = []
+        for kind in self.codec.kinds[self.ops[index]]:
+            if kind == "A":
+                operands.append((kind, self.symbols[args[pos]]))
+                pos += 1
+            elif kind == "N":
+                operands.append((kind, args[pos]))
+                pos += 1
+            else:
+                operands.append((kind, args[pos + 1:pos + 1 + args[pos]].tolist()))
+                pos += 1 + args[pos]
+        return operands
+
+    def child_indices(self, index):
+        indices = []
+        for kind, value in self.operands(index):
+            if kind == "N":
+                indices.append(value)
+            elif kind == "L":
+                indices.extend(value)
+        return indices
+
+    def to_expression(self, index):
+        return TF.fold(index, lambda node, children, _context: self.build_node(node, children), self.child_indices)
+
+    def build_node(self, index, children):
+        children = iter(children)
+        args = []
+        for kind, value in self.operands(index):
+            if kind == "A":
+                args.append(value)
+            elif kind == "N":
+                args.append(next(children))
+            else:
+                args.append([next(children) for _ in value])
+        return self.codec.classes[self.ops[index]](*args)
+
+    def equal_nodes(self, index, other, other_index):
+        if self is other:
+            return index == other_index
+        pending = [(index, other_index)]
+        compared = set()
+        while len(pending) > 0:
+            pair = pending.pop()
+            if pair in compared:
+                continue
+            compared.add(pair)
+            i, j = pair
+            if self.codec.classes[self.ops[i]] is not other.codec.classes[other.ops[j]]:
+                return False
+            for (kind, value), (_, other_value) in zip(self.operands(i), other.operands(j)):
+                if kind == "A":
+                    if type(value) is not type(other_value) or value != other_value:
+                        return False
+                elif kind == "N":
+                    pending.append((value, other_value))
+                else:
+                    if len(value) != len(other_value):
+                        return False
+                    pending.extend(zip(value, other_value))
+        return True
+
+
+class ArenaExpression:
+    __slots__ = ("arena", "index")
+
+    def __init__(self, arena, index):
+        self.arena = arena
+        self.index = index
+
+    def __repr__(self):
+        return str(self)
+
+    def children(self):
+        return [ArenaExpression(self.arena, index) for index in self.arena.child_indices(self.index)]
+
+    def equal(self, other):
+        if isinstance(other, ArenaExpression):
+            return self.arena.equal_nodes(self.index, other.arena, other.index)
+        return self.to_expression().equal(other)
+
+    def to_expression(self):
+        return self.arena.to_expression(self.index)
+
+    def to_string(self, level=0):
+        return self.to_expression().to_string(level)
+
+    def __str__(self):
+        return str(self.to_expression())
@@ -0,0 +1,254 @@
+_VERSION = 1
+
+_END = 0
+_REF = 1
+_FIRST_OPCODE = 2
+
+_NONE = 0
+_EXPR = 1
+_ATOM = 2
+_TUPLE = 3
+_LIST = 4
+
+_STR = 0
+_FALSE = 1
+_TRUE = 2
+_INT = 3
+
+
+class ByteReader:
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def byte(self):
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def varint(self):
+        value = 0
+        shift = 0
+        while True:
+            byte = self.data[self.pos]
+            self.pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def text(self):
+        length = self.varint()
+        value = str(self.data[self.pos:self.pos + length], "utf-8")
+        self.pos += length
+        return value
+
+
+class ExpressionCodec:
+    def __init__(self, signatures):
+        # One (class, kinds, types) triple per node class, with a kind for each __reduce__ argument: "N" for a
+        # subexpression, "L" for a sequence of subexpressions and "A" for an atom (str, bool or int) kept in the symbol
+        # table. Decoding checks each argument against its type: the exact type of an atom, since bool is also an int,
+        # and the expected class of a subexpression or of every item in a sequence.
+        self.classes = [cls for cls, _, _ in signatures]
+        self.kinds = [kinds for _, kinds, _ in signatures]
+        self.types = [types for _, _, types in signatures]
+        self.opcodes = {cls: _FIRST_OPCODE + i for i, cls in enumerate(self.classes)}
+        # Decoding fast paths: the number of subexpressions for classes made only of them, -1 for a single atom
+        self.arities = [len(kinds) if set(kinds) == {"N"} else -1 if kinds == "A" else None for kinds in self.kinds]
+
+    @staticmethod
+    def write_varint(out, value):
+        while value >= 0x80:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+
+    @staticmethod
+    def intern(symbols, atom):
+        key = (type(atom), atom)
+        if key not in symbols:
+            symbols[key] = len(symbols)
+        return symbols[key]
+
+    def encode(self, value):
+        # Layout: version, symbol table, then one tagged value. Expressions are postfix opcode streams, and a subtree
+        # seen earlier anywhere in the stream is written as a back-reference, so shared (hash-consed) nodes cost a
+        # few bytes however often they occur.
+        symbols = {}
+        body = bytearray()
+        self.write_value(body, value, symbols, {})
+        out = bytearray([_VERSION])
+        ExpressionCodec.write_varint(out, len(symbols))
+        for atom_type, atom in symbols:
+            if atom_type is bool:
+                out.append(_TRUE if atom else _FALSE)
+            elif atom_type is int:
+                out.append(_INT)
+                ExpressionCodec.write_varint(out, 2 * atom if atom >= 0 else -2 * atom - 1)
+            else:
+                data = str(atom).encode("utf-8")
+                out.append(_STR)
+                ExpressionCodec.write_varint(out, len(data))
+                out += data
+        out += body
+        return bytes(out)
+
+    def write_value(self, out, value, symbols, ids):
+        if value is None:
+            out.append(_NONE)
+        elif type(value) in self.opcodes:
+            out.append(_EXPR)
+            self.write_expression(out, value, symbols, ids)
+        elif isinstance(value, (tuple, list)):
+            out.append(_TUPLE if isinstance(value, tuple) else _LIST)
+            ExpressionCodec.write_varint(out, len(value))
+            for item in value:
+                self.write_value(out, item, symbols, ids)
+        elif isinstance(value, (str, bool, int)):
+            out.append(_ATOM)
+            ExpressionCodec.write_varint(out, ExpressionCodec.intern(symbols, value))
+        else:
+            raise ValueError("Cannot encode value of type " + type(value).__name__)
+
+    def write_expression(self, out, expr, symbols, ids):
+        pending = [(expr, False)]
+        while len(pending) > 0:
+            node, expanded = pending.pop()
+            if not expanded:
+                if node in ids:
+                    out.append(_REF)
+                    ExpressionCodec.write_varint(out, ids[node])
+                    continue
+                pending.append((node, True))
+                pending.extend((child, False) for child in reversed(self.node_children(node)))
+                continue
+            opcode = self.opcodes[type(node)]
+            out.append(opcode)
+            for kind, arg in zip(self.kinds[opcode - _FIRST_OPCODE], node.__reduce__()[1]):
+                if kind == "A":
+                    ExpressionCodec.write_varint(out, ExpressionCodec.intern(symbols, arg))
+                elif kind == "L":
+                    ExpressionCodec.write_varint(out, len(arg))
+            ids[node] = len(ids)
+        out.append(_END)
+
+    def node_children(self, node):
+        children = []
+        for kind, arg in zip(self.kinds[self.opcodes[type(node)] - _FIRST_OPCODE], node.__reduce__()[1]):
+            if kind == "N":
+                children.append(arg)
+            elif kind == "L":
+                children.extend(arg)
+        return children
+
+    def decode(self, data):
+        try:
+            return self.read(ByteReader(data))
+        except IndexError:
+            raise ValueError("Truncated expression encoding")
+
+    def read(self, reader):
+        version = reader.byte()
+        if version != _VERSION:
+            raise ValueError("Unsupported expression encoding version: " + str(version))
+        symbols = []
+        for _ in range(reader.varint()):
+            tag = reader.byte()
+            if tag == _STR:
+                symbols.append(reader.text())
+            elif tag == _INT:
+                value = reader.varint()
+                symbols.append(value >> 1 if value & 1 == 0 else -(value >> 1) - 1)
+            elif tag in (_FALSE, _TRUE):
+                symbols.append(tag == _TRUE)
+            else:
+                raise ValueError("Unknown symbol tag in expression encoding: " + str(tag))
+        value = self.read_value(reader, symbols, [])
+        if reader.pos != len(reader.data):
+            raise ValueError("Unexpected trailing bytes in expression encoding")
+        return value
+
+    def read_value(self, reader, symbols, nodes):
+        tag = reader.byte()
+        if tag == _NONE:
+            return None
+        if tag == _EXPR:
+            return self.read_expression(reader, symbols, nodes)
+        if tag == _ATOM:
+            return symbols[reader.varint()]
+        if tag == _TUPLE or tag == _LIST:
+            items = [self.read_value(reader, symbols, nodes) for _ in range(reader.varint())]
+            return tuple(items) if tag == _TUPLE else items
+        raise ValueError("Unknown value tag in expression encoding: " + str(tag))
+
+    def read_expression(self, reader, symbols, nodes):
+        stack = []
+        while True:
+            opcode = reader.byte()
+            if opcode == _END:
+                break
+            if opcode == _REF:
+                stack.append(nodes[reader.varint()])
+                continue
+            if opcode - _FIRST_OPCODE >= len(self.classes):
+                raise ValueError("Unknown opcode in expression encoding: " + str(opcode))
+            position = opcode - _FIRST_OPCODE
+            arity = self.arities[position]
+            if arity == -1:
+                node = self.build(position, [symbols[reader.varint()]])
+                nodes.append(node)
+                stack.append(node)
+                continue
+            if arity is not None and len(stack) >= arity:
+                node = self.build(position, stack[len(stack) - arity:])
+                del stack[len(stack) - arity:]
+                nodes.append(node)
+                stack.append(node)
+                continue
+            # Atoms and sequence lengths follow the opcode; the subexpressions are already on the stack, in order
+            fields = []
+            for kind in self.kinds[position]:
+                if kind == "A":
+                    fields.append((kind, symbols[reader.varint()]))
+                else:
+                    fields.append((kind, 1 if kind == "N" else reader.varint()))
+            start = len(stack) - sum(field for kind, field in fields if kind != "A")
+            if start < 0:
+                raise ValueError("Malformed expression encoding")
+            offset = start
+            args = []
+            for kind, field in fields:
+                if kind == "A":
+                    args.append(field)
+                elif kind == "N":
+                    args.append(stack[offset])
+                    offset += 1
+                else:
+                    args.append(stack[offset:offset + field])
+                    offset += field
+            del stack[start:]
+            node = self.build(position, args)
+            nodes.append(node)
+            stack.append(node)
+        if len(stack) != 1:
+            raise ValueError("Malformed expression encoding")
+        return stack[0]
+
+    def build(self, position, args):
+        cls = self.classes[position]
+        for kind, expected, arg in zip(self.kinds[position], self.types[position], args):
+            if kind == "A":
+                valid = type(arg) is expected
+            elif kind == "N":
+                valid = isinstance(arg, expected)
+            else:
+                valid = all(isinstance(item, expected) for item in arg)
+            if not valid:
+                raise ValueError("Malformed expression encoding: unexpected operand for " + cls.__name__)
+        try:
+            return cls(*args)
+        except Exception as e:
+            raise ValueError("Malformed expression encoding: " + cls.__name__ + ": " + str(e)) from e
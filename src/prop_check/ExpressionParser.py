@@ -0,0 +1,129 @@
+import collections
+
+
+class TokenCursor:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def at_end(self):
+        return self.pos >= len(self.tokens)
+
+    def peek(self, offset=0):
+        if self.pos + offset >= len(self.tokens):
+            return None
+        return self.tokens[self.pos + offset]
+
+    def peek_type(self, offset=0):
+        token = self.peek(offset)
+        return None if token is None else token.type
+
+    def advance(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def rest(self):
+        return self.tokens[self.pos:]
+
+
+class StreamingTokenCursor(TokenCursor):
+    def __init__(self, tokens):
+        super().__init__([])
+        self.source = iter(tokens)
+        self.buffer = collections.deque()
+
+    def fill(self, count):
+        while len(self.buffer) < count:
+            token = next(self.source, None)
+            if token is None:
+                return False
+            self.buffer.append(token)
+        return True
+
+    def at_end(self):
+        return not self.fill(1)
+
+    def peek(self, offset=0):
+        if not self.fill(offset + 1):
+            return None
+        return self.buffer[offset]
+
+    def advance(self):
+        self.fill(1)
+        self.pos += 1
+        return self.buffer.popleft()
+
+    def rest(self):
+        return list(self.buffer) + list(self.source)
+
+
+class ExpressionParser:
+    def __init__(self, connectives, not_class, parse_atom_steps):
+        # connectives run from the loosest to the tightest binding, and each is right associative.
+        # parse_atom_steps(cursor) is a generator like the *_steps methods below.
+        self.connectives = connectives
+        self.levels = {tok_type: level for level, (tok_type, _) in enumerate(connectives)}
+        self.not_class = not_class
+        self.parse_atom_steps = parse_atom_steps
+
+    @staticmethod
+    def run(steps):
+        # Each *_steps generator yields the generator of a nested parse and is sent back its result, so nesting is
+        # kept on this explicit stack rather than the Python call stack and deep input cannot hit the recursion limit
+        stack = [steps]
+        value = None
+        while True:
+            try:
+                nested = stack[-1].send(value)
+            except StopIteration as stop:
+                stack.pop()
+                if len(stack) == 0:
+                    return stop.value
+                value = stop.value
+            else:
+                stack.append(nested)
+                value = None
+
+    def parse_expression(self, cursor):
+        return ExpressionParser.run(self.expression_steps(cursor))
+
+    def parse_negation(self, cursor):
+        return ExpressionParser.run(self.negation_steps(cursor))
+
+    def parse_atom(self, cursor):
+        return ExpressionParser.run(self.parse_atom_steps(cursor))
+
+    def expression_steps(self, cursor):
+        # Operator precedence parsing: an operator is applied once the next one binds no tighter than it does, and
+        # equal levels wait, which makes every connective right associative
+        operands = []
+        operators = []
+        while True:
+            operands.append((yield self.negation_steps(cursor)))
+            level = self.levels.get(cursor.peek_type())
+            while len(operators) > 0 and (level is None or operators[-1] > level):
+                rhs = operands.pop()
+                operands.append(self.connectives[operators.pop()][1](operands.pop(), rhs))
+            if level is None:
+                return operands[0]
+            cursor.advance()
+            operators.append(level)
+
+    def negation_steps(self, cursor):
+        negations = 0
+        while cursor.peek_type() == 'NOT':
+            cursor.advance()
+            negations += 1
+        expr = yield self.parse_atom_steps(cursor)
+        if negations > 0:
+            # A negation followed by another '~' starts over, keeping only the last negated atom
+            while cursor.peek_type() == 'NOT':
+                cursor.advance()
+                while cursor.peek_type() == 'NOT':
+                    cursor.advance()
+                    negations += 1
+                expr = yield self.parse_atom_steps(cursor)
+            for _ in range(negations):
+                expr = self.not_class(expr)
+        return expr
@@ -0,0 +1,16 @@
+import weakref
+
+
+class HashConsed(type):
+    def __init__(cls, name, bases, namespace):
+        super().__init__(name, bases, namespace)
+        cls._instances = weakref.WeakValueDictionary()
+
+    def __call__(cls, *args):
+        args = tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args)
+        key = tuple((type(arg), arg) if isinstance(arg, (bool, int)) else arg for arg in args)
+        instance = cls._instances.get(key)
+        if instance is None:
+            instance = super().__call__(*args)
+            cls._instances[key] = instance
+        return instance
@@ -0,0 +1,145 @@
+import prop_check.PropositionalExpression as PExp
+import prop_check.TreeFold as TF
+
+FALSE = 0
+TRUE = 1
+_TERMINAL_LEVEL = float("inf")
+
+
+class PropositionalBdd:
+    def __init__(self, max_cache=100000, max_nodes=100000):
+        self.max_cache = max_cache
+        self.max_nodes = max_nodes
+        self.evictions = 0
+        self.reset()
+
+    def reset(self):
+        # A node is an index into the parallel level/low/high lists; 0 and 1 are the terminals. Nodes are unique,
+        # so two formulas are equivalent exactly when they build the same node.
+        self.levels = [_TERMINAL_LEVEL, _TERMINAL_LEVEL]
+        self.lows = [FALSE, TRUE]
+        self.highs = [FALSE, TRUE]
+        self.unique = {}
+        self.computed = {}
+        self.var_levels = {}
+        self.var_names = []
+
+    def level_of(self, symbol):
+        if symbol not in self.var_levels:
+            self.var_levels[symbol] = len(self.var_names)
+            self.var_names.append(symbol)
+        return self.var_levels[symbol]
+
+    def make_node(self, level, low, high):
+        if low == high:
+            return low
+        key = (level, low, high)
+        node = self.unique.get(key)
+        if node is None:
+            node = len(self.levels)
+            self.levels.append(level)
+            self.lows.append(low)
+            self.highs.append(high)
+            self.unique[key] = node
+        return node
+
+    def variable(self, symbol):
+        return self.make_node(self.level_of(symbol), FALSE, TRUE)
+
+    def cofactors(self, node, level):
+        if self.levels[node] == level:
+            return self.lows[node], self.highs[node]
+        return node, node
+
+    def ite(self, f, g, h):
+        # An explicit stack of (f, g, h, level) frames, with level None until the frame's cofactors are pushed, so
+        # formulas over thousands of variables do not hit the recursion limit
+        pending = [(f, g, h, None)]
+        results = []
+        while len(pending) > 0:
+            f, g, h, level = pending.pop()
+            if level is not None:
+                high = results.pop()
+                low = results.pop()
+                result = self.make_node(level, low, high)
+                if len(self.computed) >= self.max_cache:
+                    # The computed table is only a cache, so dropping it costs recomputation, never correctness
+                    self.computed.clear()
+                    self.evictions += 1
+                self.computed[(f, g, h)] = result
+                results.append(result)
+                continue
+            if f == TRUE or g == h:
+                results.append(g)
+                continue
+            if f == FALSE:
+                results.append(h)
+                continue
+            if g == TRUE and h == FALSE:
+                results.append(f)
+                continue
+            result = self.computed.get((f, g, h))
+            if result is not None:
+                results.append(result)
+                continue
+            level = min(self.levels[f], self.levels[g], self.levels[h])
+            f0, f1 = self.cofactors(f, level)
+            g0, g1 = self.cofactors(g, level)
+            h0, h1 = self.cofactors(h, level)
+            pending.append((f, g, h, level))
+            pending.append((f1, g1, h1, None))
+            pending.append((f0, g0, h0, None))
+        return results[0]
+
+    def negate(self, f):
+        return self.ite(f, FALSE, TRUE)
+
+    def from_expression(self, expr):
+        # Unseen variables are ordered by first occurrence, left to right, which keeps related atoms close together
+        pending = [expr]
+        while len(pending) > 0:
+            term = pending.pop()
+            if isinstance(term, PExp.VariableExpression):
+                self.level_of(term.symbol)
+            pending.extend(reversed(term.children()))
+        return TF.fold(expr, lambda node, operands, _context: self.apply_node(node, operands))
+
+    def apply_node(self, expr, operands):
+        if isinstance(expr, PExp.ConstantExpression):
+            return TRUE if expr.value else FALSE
+        if isinstance(expr, PExp.VariableExpression):
+            return self.variable(expr.symbol)
+        if isinstance(expr, PExp.NotExpression):
+            return self.negate(operands[0])
+        a, b = operands
+        if isinstance(expr, PExp.AndExpression):
+            return self.ite(a, b, FALSE)
+        if isinstance(expr, PExp.OrExpression):
+            return self.ite(a, TRUE, b)
+        if isinstance(expr, PExp.ImpliesExpression):
+            return self.ite(a, b, TRUE)
+        if isinstance(expr, PExp.IffExpression):
+            return self.ite(a, b, self.negate(b))
+        raise ValueError("Internal Error: Unknown Binary Expression: " + str(expr))
+
+    def equivalent(self, lhs, rhs):
+        return self.from_expression(lhs) == self.from_expression(rhs)
+
+    def find_falsifying_bindings(self, expr, var_names):
+        if len(self.levels) > self.max_nodes:
+            self.reset()
+        node = self.from_expression(expr)
+        if node == TRUE:
+            return None
+        # Every path to FALSE is a counterexample. Taking the high branch whenever it can still reach FALSE, with
+        # unconstrained variables True, gives the same first failing row as the truth table when the orders agree.
+        path = {}
+        while node != FALSE:
+            name = self.var_names[self.levels[node]]
+            if self.highs[node] != TRUE:
+                path[name] = True
+                node = self.highs[node]
+            else:
+                path[name] = False
+                node = self.lows[node]
+        return {name: path.get(name, True) for name in var_names}
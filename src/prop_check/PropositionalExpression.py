@@ -1,182 +1,333 @@
+import prop_check.ExpressionCodec as EC
+import prop_check.ExpressionParser as EP
+import prop_check.HashConsed as HC
 import prop_check.PropositionalTokenizer as PTk
+import prop_check.TreeFold as TF
 
+_WORD_VARS = 12
+_COMPILE_MIN_CHUNKS = 8
+_NUMPY_WORD_VARS = 6
+_NUMPY_CHUNK_VARS = 17
+
+
+class PropositionalExpression(metaclass=HC.HashConsed):
+    __slots__ = ("structural_hash", "size", "depth", "simple", "compiled", "__weakref__")
+    level = None
 
-class PropositionalExpression:
     def __repr__(self):
         return str(self)
 
+    def __hash__(self):
+        return self.structural_hash
+
+    def init_structure(self, payload, children):
+        self.structural_hash = hash((type(self).__name__, payload) + tuple(child.structural_hash for child in children))
+        self.size = 1 + sum(child.size for child in children)
+        self.depth = 1 + max((child.depth for child in children), default=0)
+        self.simple = None
+        self.compiled = None
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, _memo):
+        return self
+
+    def equal(self, other):
+        return self is other
+
+    def eval(self, bindings):
+        return TF.fold(self, lambda node, values, _context: node.eval_step(values, bindings))
+
+    def eval_bits(self, columns, mask):
+        return TF.fold(self, lambda node, values, _context: node.eval_bits_step(values, columns, mask))
+
+    def compile(self, var_names):
+        # Straight-line code over bit columns, one assignment per distinct subformula, so evaluating a truth-table
+        # chunk is a single call instead of a tree walk. Evaluate single rows with mask 1 and columns 0 or 1.
+        key = tuple(var_names)
+        if self.compiled is None or self.compiled[0] != key:
+            self.compiled = key, PropositionalExpression.compile_bits(self, key)
+        return self.compiled[1]
+
+    def interpret(self, var_names):
+        return lambda mask, *columns: self.eval_bits(dict(zip(var_names, columns)), mask)
+
     @staticmethod
-    def parse(s):
-        tokenizer = PTk.PropositionalTokenizer()
-        expr, rest = PropositionalExpression.parse_expression(tokenizer.tokenize(s))
-        if len(rest) != 0:
-            raise ValueError("Expected END but found tokens: " + PTk.PropositionalTokenizer.stringify_tokens(rest))
-        return expr
+    def compile_bits(expr, var_names):
+        params = {name: "v" + str(i) for i, name in enumerate(var_names)}
+        lines = []
+
+        def assign(node, operands, _context):
+            code = node.bits_code(operands, params)
+            if len(operands) == 0:
+                return code
+            temp = "t" + str(len(lines))
+            lines.append("    " + temp + " = " + code + "\n")
+            return temp
+
+        result = TF.fold(expr, assign)
+        source = "def evaluate(" + ", ".join(["mask"] + ["v" + str(i) for i in range(len(var_names))]) + "):\n" + \
+            "".join(lines) + "    return " + result + "\n"
+        namespace = {}
+        exec(compile(source, "<formula>", "exec"), namespace)
+        return namespace["evaluate"]
+
+    def match(self, other, bindings):
+        return TF.match(self, other, lambda pattern, expr: pattern.match_step(expr, bindings))
+
+    def replace(self, bindings):
+        return TF.fold(self, lambda node, values, _context: node.replace_step(values, bindings))
+
+    def simplify(self):
+        if self.simple is None:
+            TF.fold(self, PropositionalExpression.simplify_node, PropositionalExpression.unsimplified_children)
+        return self.simple
 
     @staticmethod
-    def parse_expression(tokens):
-        lhs, rest = PropositionalExpression.parse_implication(tokens)
-        if len(rest) == 0:
-            expr = lhs
-        else:
-            expr = lhs
-            if rest[0].type == 'IFF':
-                expr, rest = PropositionalExpression.parse_expression(rest[1:])
-                expr = IffExpression(lhs, expr)
-        return expr, rest
+    def simplify_node(node, values, _context):
+        if node.simple is None:
+            node.simple = node.simplify_step(values)
+        return node.simple
 
     @staticmethod
-    def parse_implication(tokens):
-        lhs, rest = PropositionalExpression.parse_disjunction(tokens)
-        if len(rest) == 0:
-            expr = lhs
+    def unsimplified_children(node):
+        return () if node.simple is not None else node.children()
+
+    def to_string(self, level=0):
+        return TF.render(self, lambda node, node_level: node.to_string_parts(node_level), level)
+
+    def __str__(self):
+        return TF.render(self, lambda node, _level: node.str_parts())
+
+    def find_falsifying_bindings(self, var_names):
+        n = len(var_names)
+        word_vars = min(n, _WORD_VARS)
+        width = 1 << word_vars
+        mask = (1 << width) - 1
+        if self.compiled is not None or 1 << (n - word_vars) >= _COMPILE_MIN_CHUNKS:
+            evaluate = self.compile(var_names)
         else:
-            expr = lhs
-            if rest[0].type == 'IMPLIES':
-                expr, rest = PropositionalExpression.parse_implication(rest[1:])
-                expr = ImpliesExpression(lhs, expr)
-        return expr, rest
+            # Generating code costs a few word evaluations, so small tables are cheaper to walk
+            evaluate = self.interpret(var_names)
+        low_columns = [PropositionalExpression.bit_column(n - 1 - i, width) for i in range(n - word_vars, n)]
+        for chunk in range(1 << (n - word_vars)):
+            high_columns = [0 if (chunk >> (n - 1 - i - word_vars)) & 1 else mask for i in range(n - word_vars)]
+            failures = mask & ~evaluate(mask, *high_columns, *low_columns)
+            if failures:
+                row = (chunk << word_vars) | ((failures & -failures).bit_length() - 1)
+                return {var_names[i]: not (row >> (n - 1 - i)) & 1 for i in range(n)}
+        return None
+
+    def find_falsifying_bindings_numpy(self, var_names, chunk_vars=_NUMPY_CHUNK_VARS):
+        # Optional backend: rows are packed 64 to a uint64 word, as in find_falsifying_bindings, and the compiled
+        # formula runs on arrays of 2 ** chunk_vars rows at a time, so memory stays bounded while each NumPy call
+        # covers far more rows than one Python int can
+        try:
+            import numpy
+        except ImportError:
+            raise ValueError("find_falsifying_bindings_numpy needs NumPy, which is not installed")
+        n = len(var_names)
+        word_vars = min(n, _NUMPY_WORD_VARS)
+        chunk_vars = max(min(n, chunk_vars), word_vars)
+        words = 1 << (chunk_vars - word_vars)
+        word_mask = (1 << (1 << word_vars)) - 1
+        evaluate = self.compile(var_names)
+        mask = numpy.full(words, word_mask, dtype=numpy.uint64)
+        false_column = numpy.zeros(words, dtype=numpy.uint64)
+        word_index = numpy.arange(words, dtype=numpy.uint64)
+        low_columns = []
+        for i in range(n - chunk_vars, n):
+            bit = n - 1 - i
+            if bit < word_vars:
+                low_columns.append(numpy.full(words, PropositionalExpression.bit_column(bit, 1 << word_vars),
+                                              dtype=numpy.uint64))
+            else:
+                low_columns.append(numpy.where((word_index >> numpy.uint64(bit - word_vars)) & numpy.uint64(1),
+                                               false_column, mask))
+        for chunk in range(1 << (n - chunk_vars)):
+            high_columns = [false_column if (chunk >> (n - 1 - i - chunk_vars)) & 1 else mask
+                            for i in range(n - chunk_vars)]
+            result = numpy.broadcast_to(evaluate(mask, *high_columns, *low_columns), mask.shape)
+            failed_words = numpy.flatnonzero(result != mask)
+            if len(failed_words) > 0:
+                word = int(failed_words[0])
+                failures = word_mask & ~int(result[word])
+                row = (chunk << chunk_vars) | (word << word_vars) | ((failures & -failures).bit_length() - 1)
+                return {var_names[i]: not (row >> (n - 1 - i)) & 1 for i in range(n)}
+        return None
 
     @staticmethod
-    def parse_disjunction(tokens):
-        lhs, rest = PropositionalExpression.parse_conjunction(tokens)
-        if len(rest) == 0:
-            expr = lhs
-        else:
-            expr = lhs
-            if rest[0].type == 'OR':
-                expr, rest = PropositionalExpression.parse_disjunction(rest[1:])
-                expr = OrExpression(lhs, expr)
-        return expr, rest
+    def bit_column(bit, width):
+        run = 1 << bit
+        column = (1 << run) - 1
+        period = 2 * run
+        while period < width:
+            column |= column << period
+            period *= 2
+        return column
+
+    def to_bytes(self):
+        return PropositionalExpression.codec.encode(self)
 
     @staticmethod
-    def parse_conjunction(tokens):
-        lhs, rest = PropositionalExpression.parse_negation(tokens)
-        if len(rest) == 0:
-            expr = lhs
-        else:
-            expr = lhs
-            if rest[0].type == 'AND':
-                expr, rest = PropositionalExpression.parse_conjunction(rest[1:])
-                expr = AndExpression(lhs, expr)
-        return expr, rest
+    def from_bytes(data):
+        expr = PropositionalExpression.codec.decode(data)
+        if not isinstance(expr, PropositionalExpression):
+            raise ValueError("Encoded value is not a propositional expression")
+        return expr
 
     @staticmethod
-    def parse_negation(tokens):
-        if len(tokens) > 0 and tokens[0].type == 'NOT':
-            rest = tokens
-            while True:
-                expr, rest = PropositionalExpression.parse_negation(rest[1:])
-                expr = NotExpression(expr)
-                if len(rest) == 0 or rest[0].type != 'NOT':
-                    break
-        else:
-            expr, rest = PropositionalExpression.parse_atom(tokens)
-        return expr, rest
+    def parse(s):
+        tokenizer = PTk.PropositionalTokenizer()
+        cursor = EP.TokenCursor(tokenizer.tokenize(s))
+        expr = PropositionalExpression.parse_expression(cursor)
+        if not cursor.at_end():
+            raise ValueError("Expected END but found tokens: " +
+                             PTk.PropositionalTokenizer.stringify_tokens(cursor.rest()))
+        return expr
+
+    @staticmethod
+    def parse_expression(cursor):
+        return _PARSER.parse_expression(cursor)
+
+    @staticmethod
+    def parse_atom(cursor):
+        return _PARSER.parse_atom(cursor)
 
     @staticmethod
-    def parse_atom(tokens):
-        if len(tokens) == 0:
+    def parse_atom_steps(cursor):
+        if cursor.at_end():
             raise ValueError("Expected an atom, but found EOF")
-        if tokens[0].type == 'LPAREN':
-            expr, rest = PropositionalExpression.parse_expression(tokens[1:])
-            if len(rest) == 0:
+        if cursor.peek_type() == 'LPAREN':
+            cursor.advance()
+            expr = yield _PARSER.expression_steps(cursor)
+            if cursor.at_end():
                 raise ValueError("Expected a ')', but found EOF")
-            if rest[0].type != 'RPAREN':
-                raise ValueError("Expected a ')', but found : " + PTk.PropositionalTokenizer.stringify_tokens(rest))
-            return expr, rest[1:]
-        elif tokens[0].type == 'VAR':
-            return VariableExpression(tokens[0].value), tokens[1:]
-        elif tokens[0].type == 'PROP':
-            return ConstantExpression(tokens[0].value), tokens[1:]
+            if cursor.peek_type() != 'RPAREN':
+                raise ValueError("Expected a ')', but found : " +
+                                 PTk.PropositionalTokenizer.stringify_tokens(cursor.rest()))
+            cursor.advance()
+            return expr
+        elif cursor.peek_type() == 'VAR':
+            return VariableExpression(cursor.advance().value)
+        elif cursor.peek_type() == 'PROP':
+            return ConstantExpression(cursor.advance().value)
         else:
             raise ValueError("Expected a variable or constant, but found: " +
-                             PTk.PropositionalTokenizer.stringify_tokens(tokens))
+                             PTk.PropositionalTokenizer.stringify_tokens(cursor.rest()))
 
 
 class ConstantExpression (PropositionalExpression):
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
+        self.init_structure(value, ())
+
+    def __reduce__(self):
+        return ConstantExpression, (self.value,)
 
-    def eval(self, _bindings):
+    def eval_step(self, _values, _bindings):
         return self.value
 
-    def match(self, other, _bindings):
+    def eval_bits_step(self, _values, _columns, mask):
+        return mask if self.value else 0
+
+    def bits_code(self, _operands, _params):
+        return "mask" if self.value else "0"
+
+    def match_step(self, other, _bindings):
         return self.equal(other)
 
-    def replace(self, _bindings):
+    def replace_step(self, _values, _bindings):
         return self
 
-    def equal(self, other):
-        return isinstance(other, ConstantExpression) and self.value == other.value
-
-    def simplify(self):
+    def simplify_step(self, _values):
         return self
 
     # noinspection PyMethodMayBeStatic
     def children(self):
         return []
 
-    def __str__(self):
-        return str(self.value)
+    def str_parts(self):
+        return [str(self.value)]
 
-    def to_string(self, _level=0):
-        return str(self.value)
+    def to_string_parts(self, _level):
+        return [str(self.value)]
 
 
 class VariableExpression (PropositionalExpression):
+    __slots__ = ("symbol",)
+
     def __init__(self, symbol):
         self.symbol = symbol
+        self.init_structure(symbol, ())
 
-    def eval(self, bindings):
+    def __reduce__(self):
+        return VariableExpression, (self.symbol,)
+
+    def eval_step(self, _values, bindings):
         return bindings[self.symbol]
 
-    def match(self, other, bindings):
+    def eval_bits_step(self, _values, columns, _mask):
+        return columns[self.symbol]
+
+    def bits_code(self, _operands, params):
+        return params[self.symbol]
+
+    def match_step(self, other, bindings):
         if self.symbol in bindings:
             return bindings[self.symbol].equal(other)
         bindings[self.symbol] = other
         return True
 
-    def replace(self, bindings):
+    def replace_step(self, _values, bindings):
         if self.symbol in bindings:
             return bindings[self.symbol]
         return self
 
-    def equal(self, other):
-        return isinstance(other, VariableExpression) and self.symbol == other.symbol
-
-    def simplify(self):
+    def simplify_step(self, _values):
         return self
 
     # noinspection PyMethodMayBeStatic
     def children(self):
         return []
 
-    def __str__(self):
-        return self.symbol
+    def str_parts(self):
+        return [self.symbol]
 
-    def to_string(self, _level=0):
-        return self.symbol
+    def to_string_parts(self, _level):
+        return [self.symbol]
 
 
 class NotExpression (PropositionalExpression):
+    __slots__ = ("expr",)
+
     def __init__(self, expr):
         self.expr = expr
+        self.init_structure(None, (expr,))
 
-    def eval(self, bindings):
-        return not self.expr.eval(bindings)
+    def __reduce__(self):
+        return NotExpression, (self.expr,)
 
-    def match(self, other, bindings):
-        return isinstance(other, NotExpression) and self.expr.match(other.expr, bindings)
+    def eval_step(self, values, _bindings):
+        return not values[0]
 
-    def replace(self, bindings):
-        return NotExpression(self.expr.replace(bindings))
+    def eval_bits_step(self, values, _columns, mask):
+        return mask ^ values[0]
 
-    def equal(self, other):
-        return isinstance(other, NotExpression) and self.expr.equal(other.expr)
+    def bits_code(self, operands, _params):
+        return "mask ^ " + operands[0]
 
-    def simplify(self):
-        expr1 = self.expr.simplify()
+    def match_step(self, other, _bindings):
+        return isinstance(other, NotExpression) and [(self.expr, other.expr)]
+
+    def replace_step(self, values, _bindings):
+        return NotExpression(values[0])
+
+    def simplify_step(self, values):
+        expr1 = values[0]
         if isinstance(expr1, NotExpression):
             return expr1.expr
         elif isinstance(expr1, ConstantExpression):
@@ -187,41 +338,38 @@ class NotExpression (PropositionalExpression):
     def children(self):
         return [self.expr]
 
-    def __str__(self):
-        return "Not(" + str(self.expr) + ")"
+    def str_parts(self):
+        return ["Not(", (self.expr, 0), ")"]
 
-    def to_string(self, level=0):
-        left = self.expr.to_string(10)
+    def to_string_parts(self, level):
         if level > 10:
-            return "(~" + left + ")"
+            return ["(~", (self.expr, 10), ")"]
         else:
-            return "~" + left
+            return ["~", (self.expr, 10)]
 
 
 class BinaryExpression (PropositionalExpression):
-    def __init__(self, opstr, op, level, lhs, rhs):
-        self.opstr = opstr
-        self.op = op
-        self.level = level
+    __slots__ = ("lhs", "rhs")
+    opstr = None
+    op = None
+    level = None
+
+    def __init__(self, lhs, rhs):
         self.lhs = lhs
         self.rhs = rhs
+        self.init_structure(None, (lhs, rhs))
 
-    def match(self, expr, bindings):
-        return isinstance(expr, type(self)) \
-               and self.lhs.match(expr.lhs, bindings) \
-               and self.rhs.match(expr.rhs, bindings)
+    def __reduce__(self):
+        return type(self), (self.lhs, self.rhs)
 
-    def replace(self, bindings):
-        return (type(self))(self.lhs.replace(bindings), self.rhs.replace(bindings))
+    def match_step(self, expr, _bindings):
+        return isinstance(expr, type(self)) and [(self.lhs, expr.lhs), (self.rhs, expr.rhs)]
 
-    def equal(self, other):
-        return isinstance(other, type(self)) \
-               and self.lhs.equal(other.lhs) \
-               and self.rhs.equal(other.rhs)
+    def replace_step(self, values, _bindings):
+        return (type(self))(values[0], values[1])
 
-    def simplify(self):
-        expr1 = self.lhs.simplify()
-        expr2 = self.rhs.simplify()
+    def simplify_step(self, values):
+        expr1, expr2 = values
         if isinstance(expr1, ConstantExpression):
             if isinstance(expr2, ConstantExpression):
                 return type(self).create_const_lhs_rhs(expr1, expr2)
@@ -238,25 +386,26 @@ class BinaryExpression (PropositionalExpression):
     def children(self):
         return [self.lhs, self.rhs]
 
-    def __str__(self):
-        return self.opstr + "(" + str(self.lhs) + ", " + str(self.rhs) + ")"
+    def str_parts(self):
+        return [self.opstr + "(", (self.lhs, 0), ", ", (self.rhs, 0), ")"]
 
-    def to_string(self, level=0):
-        left = self.lhs.to_string(self.level + 1)
-        right = self.rhs.to_string(self.level)
+    def to_string_parts(self, level):
+        parts = [(self.lhs, self.level + 1), " " + self.op + " ", (self.rhs, self.level)]
         if level > self.level:
-            return "(" + left + " " + self.op + " " + right + ")"
+            return ["("] + parts + [")"]
         else:
-            return left + " " + self.op + " " + right
+            return parts
 
 
 class AndExpression (BinaryExpression):
-    def __init__(self, lhs, rhs):
-        super().__init__("And", "/\\", 8, lhs, rhs)
+    __slots__ = ()
+    opstr = "And"
+    op = "/\\"
+    level = 8
 
     @staticmethod
     def create_const_lhs_rhs(expr1, expr2):
-        return ConstantExpression(expr1.value and expr2.value1)
+        return ConstantExpression(expr1.value and expr2.value)
 
     @staticmethod
     def create_const_lhs(expr1, expr2):
@@ -269,17 +418,25 @@ class AndExpression (BinaryExpression):
     def create_const_rhs(expr1, expr2):
         return AndExpression.create_const_lhs(expr2, expr1)
 
-    def eval(self, bindings):
-        return self.lhs.eval(bindings) and self.rhs.eval(bindings)
+    def eval_step(self, values, _bindings):
+        return values[0] and values[1]
+
+    def eval_bits_step(self, values, _columns, _mask):
+        return values[0] & values[1]
+
+    def bits_code(self, operands, _params):
+        return operands[0] + " & " + operands[1]
 
 
 class OrExpression (BinaryExpression):
-    def __init__(self, lhs, rhs):
-        super().__init__("Or", "\\/", 6, lhs, rhs)
+    __slots__ = ()
+    opstr = "Or"
+    op = "\\/"
+    level = 6
 
     @staticmethod
     def create_const_lhs_rhs(expr1, expr2):
-        return ConstantExpression(expr1.value or expr2.value1)
+        return ConstantExpression(expr1.value or expr2.value)
 
     @staticmethod
     def create_const_lhs(expr1, expr2):
@@ -292,17 +449,25 @@ class OrExpression (BinaryExpression):
     def create_const_rhs(expr1, expr2):
         return OrExpression.create_const_lhs(expr2, expr1)
 
-    def eval(self, bindings):
-        return self.lhs.eval(bindings) or self.rhs.eval(bindings)
+    def eval_step(self, values, _bindings):
+        return values[0] or values[1]
+
+    def eval_bits_step(self, values, _columns, _mask):
+        return values[0] | values[1]
+
+    def bits_code(self, operands, _params):
+        return operands[0] + " | " + operands[1]
 
 
 class ImpliesExpression (BinaryExpression):
-    def __init__(self, lhs, rhs):
-        super().__init__("Implies", "==>", 4, lhs, rhs)
+    __slots__ = ()
+    opstr = "Implies"
+    op = "==>"
+    level = 4
 
     @staticmethod
     def create_const_lhs_rhs(expr1, expr2):
-        return ConstantExpression((not expr1.value) or expr2.value1)
+        return ConstantExpression((not expr1.value) or expr2.value)
 
     @staticmethod
     def create_const_lhs(expr1, expr2):
@@ -318,17 +483,25 @@ class ImpliesExpression (BinaryExpression):
         else:
             return NotExpression(expr1)
 
-    def eval(self, bindings):
-        return (not self.lhs.eval(bindings)) or self.rhs.eval(bindings)
+    def eval_step(self, values, _bindings):
+        return (not values[0]) or values[1]
+
+    def eval_bits_step(self, values, _columns, mask):
+        return (mask ^ values[0]) | values[1]
+
+    def bits_code(self, operands, _params):
+        return "(mask ^ " + operands[0] + ") | " + operands[1]
 
 
 class IffExpression (BinaryExpression):
-    def __init__(self, lhs, rhs):
-        super().__init__("Iff", "<=>", 2, lhs, rhs)
+    __slots__ = ()
+    opstr = "Iff"
+    op = "<=>"
+    level = 2
 
     @staticmethod
     def create_const_lhs_rhs(expr1, expr2):
-        return ConstantExpression((not expr1.value) or expr2.value1)
+        return ConstantExpression(expr1.value == expr2.value)
 
     @staticmethod
     def create_const_lhs(expr1, expr2):
@@ -341,11 +514,35 @@ class IffExpression (BinaryExpression):
     def create_const_rhs(expr1, expr2):
         return IffExpression.create_const_lhs(expr2, expr1)
 
-    def eval(self, bindings):
-        if self.lhs.eval(bindings):
-            return self.rhs.eval(bindings)
+    def eval_step(self, values, _bindings):
+        if values[0]:
+            return values[1]
         else:
-            return not self.rhs.eval(bindings)
+            return not values[1]
+
+    def eval_bits_step(self, values, _columns, mask):
+        return mask ^ values[0] ^ values[1]
+
+    def bits_code(self, operands, _params):
+        return "mask ^ " + operands[0] + " ^ " + operands[1]
+
+
+# Opcodes are positions in this list, so new classes go at the end to keep existing encodings readable
+PropositionalExpression.codec = EC.ExpressionCodec(
+    [(ConstantExpression, "A", (bool,)),
+     (VariableExpression, "A", (str,)),
+     (NotExpression, "N", (PropositionalExpression,)),
+     (AndExpression, "NN", (PropositionalExpression, PropositionalExpression)),
+     (OrExpression, "NN", (PropositionalExpression, PropositionalExpression)),
+     (ImpliesExpression, "NN", (PropositionalExpression, PropositionalExpression)),
+     (IffExpression, "NN", (PropositionalExpression, PropositionalExpression))])
+
+_PARSER = EP.ExpressionParser([('IFF', IffExpression),
+                               ('IMPLIES', ImpliesExpression),
+                               ('OR', OrExpression),
+                               ('AND', AndExpression)],
+                              NotExpression,
+                              PropositionalExpression.parse_atom_steps)
 
 
 # expr1 = PropositionalExpression.parse("(p ==> q <=> r /\\ s \\/ (t <=> ~(~u) /\\ v)) " +
@@ -1,54 +1,49 @@
 import prop_check.PropositionalExpression as PExp
+import prop_check.PropositionalSatSolver as PropSat
+import prop_check.TreeFold as TF
 
 class PropositionalNormalForm:
     @staticmethod
-    def convert_to_negation_normal_form(expr):
+    def negation_normal_form_plan(expr):
+        # The subformulas whose normal forms are needed, and how to combine those normal forms into this one
         expr1 = expr.simplify()
         if isinstance(expr1, PExp.AndExpression):
-            return PExp.AndExpression(PropositionalNormalForm.convert_to_negation_normal_form(expr1.lhs),
-                                      PropositionalNormalForm.convert_to_negation_normal_form(expr1.rhs))
+            return PExp.AndExpression, [expr1.lhs, expr1.rhs]
         elif isinstance(expr1, PExp.OrExpression):
-            return PExp.OrExpression(PropositionalNormalForm.convert_to_negation_normal_form(expr1.lhs),
-                                      PropositionalNormalForm.convert_to_negation_normal_form(expr1.rhs))
+            return PExp.OrExpression, [expr1.lhs, expr1.rhs]
         elif isinstance(expr1, PExp.ImpliesExpression):
-            return PExp.OrExpression(PropositionalNormalForm.convert_to_negation_normal_form(
-                                        PExp.NotExpression(expr1.lhs)),
-                                     PropositionalNormalForm.convert_to_negation_normal_form(expr1.rhs))
+            return PExp.OrExpression, [PExp.NotExpression(expr1.lhs), expr1.rhs]
         elif isinstance(expr1, PExp.IffExpression):
-            return PExp.OrExpression(
-                        PExp.AndExpression(PropositionalNormalForm.convert_to_negation_normal_form(expr1.lhs),
-                                           PropositionalNormalForm.convert_to_negation_normal_form(expr1.rhs)),
-                        PExp.AndExpression(PropositionalNormalForm.convert_to_negation_normal_form(
-                                                PExp.NotExpression(expr1.lhs)),
-                                           PropositionalNormalForm.convert_to_negation_normal_form(
-                                                PExp.NotExpression(expr1.rhs))))
+            return PropositionalNormalForm.or_of_ands, [expr1.lhs, expr1.rhs,
+                                                        PExp.NotExpression(expr1.lhs), PExp.NotExpression(expr1.rhs)]
         elif isinstance(expr1, PExp.NotExpression):
             expr2 = expr1.expr
             if isinstance(expr2, PExp.NotExpression):
-                return PropositionalNormalForm.convert_to_negation_normal_form(expr2.expr)
+                return (lambda nnf: nnf), [expr2.expr]
             elif isinstance(expr2, PExp.AndExpression):
-                return PExp.OrExpression(PropositionalNormalForm.convert_to_negation_normal_form(
-                                            PExp.NotExpression(expr2.lhs)),
-                                         PropositionalNormalForm.convert_to_negation_normal_form(
-                                            PExp.NotExpression(expr2.rhs)))
+                return PExp.OrExpression, [PExp.NotExpression(expr2.lhs), PExp.NotExpression(expr2.rhs)]
             elif isinstance(expr2, PExp.OrExpression):
-                return PExp.AndExpression(PropositionalNormalForm.convert_to_negation_normal_form(
-                                            PExp.NotExpression(expr2.lhs)),
-                                          PropositionalNormalForm.convert_to_negation_normal_form(
-                                            PExp.NotExpression(expr2.rhs)))
+                return PExp.AndExpression, [PExp.NotExpression(expr2.lhs), PExp.NotExpression(expr2.rhs)]
             elif isinstance(expr2, PExp.ImpliesExpression):
-                return PExp.AndExpression(PropositionalNormalForm.convert_to_negation_normal_form(expr2.lhs),
-                                          PropositionalNormalForm.convert_to_negation_normal_form(
-                                              PExp.NotExpression(expr2.rhs)))
+                return PExp.AndExpression, [expr2.lhs, PExp.NotExpression(expr2.rhs)]
             elif isinstance(expr2, PExp.IffExpression):
-                return PExp.OrExpression(
-                            PExp.AndExpression(PropositionalNormalForm.convert_to_negation_normal_form(expr2.lhs),
-                                               PropositionalNormalForm.convert_to_negation_normal_form(
-                                                    PExp.NotExpression(expr2.rhs))),
-                            PExp.AndExpression(PropositionalNormalForm.convert_to_negation_normal_form(
-                                                    PExp.NotExpression(expr2.lhs)),
-                                               PropositionalNormalForm.convert_to_negation_normal_form(expr2.rhs)))
-        return expr1
+                return PropositionalNormalForm.or_of_ands, [expr2.lhs, PExp.NotExpression(expr2.rhs),
+                                                            PExp.NotExpression(expr2.lhs), expr2.rhs]
+        return (lambda: expr1), []
+
+    @staticmethod
+    def or_of_ands(a, b, c, d):
+        return PExp.OrExpression(PExp.AndExpression(a, b), PExp.AndExpression(c, d))
+
+    @staticmethod
+    def convert_to_negation_normal_form(expr):
+        plans = {}
+
+        def subformulas(expr1):
+            plans[expr1] = PropositionalNormalForm.negation_normal_form_plan(expr1)
+            return plans[expr1][1]
+
+        return TF.fold(expr, lambda expr1, values, _context: plans[expr1][0](*values), subformulas)
 
     @staticmethod
     def push_and_into_or(expr):
@@ -79,6 +74,53 @@ class PropositionalNormalForm:
             return PExp.OrExpression(expr1, expr2)
         return expr
 
+    @staticmethod
+    def disjunctive_clauses(expr):
+        # DNF as a set of terms, each a frozenset of literals (variables or negated variables). Terms are built
+        # bottom-up over the shared NNF, so each subformula is distributed once, and contradictory or subsumed terms
+        # are dropped as they appear rather than carried into the product.
+        nnf = PropositionalNormalForm.convert_to_negation_normal_form(expr)
+        return TF.fold(nnf, lambda node, operands, _context: PropositionalNormalForm.disjunctive_terms(node, operands))
+
+    @staticmethod
+    def disjunctive_terms(expr, operands):
+        if isinstance(expr, PExp.ConstantExpression):
+            return frozenset([frozenset()]) if expr.value else frozenset()
+        if isinstance(expr, PExp.OrExpression):
+            return PropositionalNormalForm.remove_subsumed(operands[0] | operands[1])
+        if isinstance(expr, PExp.AndExpression):
+            terms = set()
+            for term1 in operands[0]:
+                for term2 in operands[1]:
+                    term = term1 | term2
+                    if not PropositionalNormalForm.is_contradictory(term):
+                        terms.add(term)
+            return PropositionalNormalForm.remove_subsumed(terms)
+        if isinstance(expr, PExp.VariableExpression) or isinstance(expr, PExp.NotExpression):
+            return frozenset([frozenset([expr])])
+        raise ValueError("Internal Error: Expression is not in negation normal form: " + str(expr))
+
+    @staticmethod
+    def is_contradictory(term):
+        return any(isinstance(literal, PExp.NotExpression) and literal.expr in term for literal in term)
+
+    @staticmethod
+    def remove_subsumed(terms):
+        kept = []
+        for term in sorted(terms, key=len):
+            if not any(smaller <= term for smaller in kept):
+                kept.append(term)
+        return frozenset(kept)
+
+    @staticmethod
+    def definitional_clauses(expr):
+        # Tseitin CNF: one fresh variable per distinct subformula keeps the clause set linear in the size of expr.
+        # Literals are the encoder's signed integers; var_ids maps the original symbols to their variables.
+        encoder = PropSat.TseitinEncoder()
+        top = encoder.encode(expr)
+        clauses = {frozenset(clause) for clause in encoder.clauses}
+        clauses.add(frozenset([top]))
+        return frozenset(clauses), encoder.var_ids
 
 
 # expr1 = PExp.PropositionalExpression.parse("(p <=> q) <=> ~(r ==> s)")
@@ -87,13 +129,13 @@ class PropositionalNormalForm:
 # expr2 = PropositionalNormalForm.convert_to_negation_normal_form(expr1)
 # s2 = expr2.to_string()
 # print(s2)
-
-expr1 = PExp.PropositionalExpression.parse("(p \\/ q /\\ r) /\\ (~p \\/ ~r)")
-s1 = expr1.to_string()
-print(s1)
-expr2 = PropositionalNormalForm.convert_to_negation_normal_form(expr1)
-s2 = expr2.to_string()
-print(s2)
-expr3 = PropositionalNormalForm.convert_negation_to_disjunctive_normal_form(expr2)
-s3 = expr3.to_string()
-print(s3)
+#
+# expr1 = PExp.PropositionalExpression.parse("(p \\/ q /\\ r) /\\ (~p \\/ ~r)")
+# s1 = expr1.to_string()
+# print(s1)
+# expr2 = PropositionalNormalForm.convert_to_negation_normal_form(expr1)
+# s2 = expr2.to_string()
+# print(s2)
+# expr3 = PropositionalNormalForm.convert_negation_to_disjunctive_normal_form(expr2)
+# s3 = expr3.to_string()
+# print(s3)
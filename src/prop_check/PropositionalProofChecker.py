@@ -1,79 +1,142 @@
+import functools
+import types
+
+import prop_check.AxiomIndex as AI
+import prop_check.DiscriminationTree as DT
+import prop_check.ExpressionParser as EP
 import prop_check.PropositionalExpression as PExp
 import prop_check.PropositionalTokenizer as PTk
 import prop_check.PropositionalMatcher as PMatch
+import prop_check.StepCache as SC
 
 _parse = PExp.PropositionalExpression.parse
 
 
-_AXIOMS = {"\\/ identity": (_parse("x \\/ False"), _parse("x")),
-           "\\/ null": (_parse("x \\/ True"), _parse("True")),
-           "\\/ commutative": (_parse("x \\/ y"), _parse("y \\/ x")),
-           "\\/ associative": (_parse("x \\/ (y \\/ z)"), _parse("(x \\/ y) \\/ z")),
-           "\\/ distributive": (_parse("x \\/ (y /\\ z)"), _parse("(x \\/ y) /\\ (x \\/ z)")),
-           "implication": (_parse("x ==> y"), _parse("(~x) \\/ y")),
-           "\\/ demorgan": (_parse("~(x \\/ y)"), _parse("(~x) /\\ (~y)")),
-           "\\/ idempotent": (_parse("x \\/ x"), _parse("x")),
-           "self - implication": (_parse("x ==> x"), _parse("True")),
-           "double negation": (_parse("~(~x)"), _parse("x"))
+# Parsed on first use, by AxiomSet.standard, so importing the checker does not parse the whole table
+_AXIOMS = {"\\/ identity": ("x \\/ False", "x"),
+           "\\/ null": ("x \\/ True", "True"),
+           "\\/ commutative": ("x \\/ y", "y \\/ x"),
+           "\\/ associative": ("x \\/ (y \\/ z)", "(x \\/ y) \\/ z"),
+           "\\/ distributive": ("x \\/ (y /\\ z)", "(x \\/ y) /\\ (x \\/ z)"),
+           "implication": ("x ==> y", "(~x) \\/ y"),
+           "\\/ demorgan": ("~(x \\/ y)", "(~x) /\\ (~y)"),
+           "\\/ idempotent": ("x \\/ x", "x"),
+           "self - implication": ("x ==> x", "True"),
+           "double negation": ("~(~x)", "x")
            }
 
 
+class AxiomSet:
+    def __init__(self, axioms):
+        self.axioms = types.MappingProxyType(dict(axioms))
+        self.index = AI.AxiomIndex(self.axioms)
+        self.tree = DT.DiscriminationTree()
+        for name, axiom in self.axioms.items():
+            self.tree.insert(axiom[0], name)
+
+    def extend(self, extra_axioms):
+        if len(extra_axioms) == 0:
+            return self
+        axioms = dict(self.axioms)
+        axioms.update(extra_axioms)
+        return AxiomSet(axioms)
+
+    @staticmethod
+    @functools.cache
+    def standard():
+        return AxiomSet({name: (_parse(lhs), _parse(rhs)) for name, (lhs, rhs) in _AXIOMS.items()})
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def compile(extra_axioms):
+        return AxiomSet.standard().extend(PropositionalProof.parse_extra_axioms(extra_axioms))
+
+
 class PropositionalProof:
-    def __init__(self, lhs, rhs, extra_axioms=None):
+    def __init__(self, lhs, rhs, extra_axioms=None, cache=None):
         if isinstance(lhs, str):
             lhs = _parse(lhs)
         if isinstance(rhs, str):
             rhs = _parse(rhs)
         self.lhs = lhs
         self.rhs = rhs
-        self.axioms = _AXIOMS
-        if extra_axioms is not None:
-            if isinstance(extra_axioms, str):
-                extra_axioms = PropositionalProof.parse_extra_axioms(extra_axioms)
-            self.axioms.update(extra_axioms)
+        if extra_axioms is None:
+            axiom_set = AxiomSet.standard()
+        elif isinstance(extra_axioms, AxiomSet):
+            axiom_set = extra_axioms
+        elif isinstance(extra_axioms, str):
+            axiom_set = AxiomSet.compile(extra_axioms)
+        else:
+            axiom_set = AxiomSet.standard().extend(extra_axioms)
+        self.axiom_set = axiom_set
+        self.axioms = axiom_set.axioms
+        self.index = axiom_set.index
+        self.axiom_tree = axiom_set.tree
+        self.cache = cache
         self.steps = []
 
     @staticmethod
-    def parse_eq_rhs_reason(tokens):
-        if tokens[0].type != 'EQ':
-            raise ValueError("Expected a '=', but found : " + PTk.PropositionalTokenizer.stringify_tokens(tokens))
-        tokens = tokens[1:]
-        rhs, tokens = PExp.PropositionalExpression.parse_expression(tokens)
-        if len(tokens) == 0:
+    def parse_eq_rhs_reason(cursor):
+        if cursor.peek_type() != 'EQ':
+            raise ValueError("Expected a '=', but found : " +
+                             PTk.PropositionalTokenizer.stringify_tokens(cursor.rest()))
+        cursor.advance()
+        rhs = PExp.PropositionalExpression.parse_expression(cursor)
+        if cursor.at_end():
             raise ValueError("Expected a '{', but found EOF")
-        if tokens[0].type != 'LBRACE':
-            raise ValueError("Expected a '{', but found : " + PTk.PropositionalTokenizer.stringify_tokens(tokens))
-        tokens = tokens[1:]
+        if cursor.peek_type() != 'LBRACE':
+            raise ValueError("Expected a '{', but found : " +
+                             PTk.PropositionalTokenizer.stringify_tokens(cursor.rest()))
+        cursor.advance()
         reason = []
-        while len(tokens) > 0 and tokens[0].type != 'RBRACE':
-            reason.append(tokens[0])
-            tokens = tokens[1:]
-        if len(tokens) == 0:
+        while not cursor.at_end() and cursor.peek_type() != 'RBRACE':
+            reason.append(cursor.advance())
+        if cursor.at_end():
             raise ValueError("Expected a '}', but found EOF")
-        tokens = tokens[1:]
+        cursor.advance()
         name = " ".join([str(token.value) for token in reason])
-        return rhs, name, tokens
+        return rhs, name
 
     @staticmethod
     def parse_extra_axioms(script):
         tokenizer = PTk.PropositionalProofTokenizer()
-        tokens = tokenizer.tokenize(script)
+        cursor = EP.TokenCursor(tokenizer.tokenize(script))
         extras = {}
-        while len(tokens) > 0:
-            lhs, tokens = PExp.PropositionalExpression.parse_expression(tokens)
-            rhs, name, tokens = PropositionalProof.parse_eq_rhs_reason(tokens)
+        while not cursor.at_end():
+            lhs = PExp.PropositionalExpression.parse_expression(cursor)
+            rhs, name = PropositionalProof.parse_eq_rhs_reason(cursor)
             extras[name] = (lhs, rhs)
         return extras
 
     @staticmethod
     def parse_proof_script(script):
         tokenizer = PTk.PropositionalProofTokenizer()
-        tokens = tokenizer.tokenize(script)
-        expr, tokens = PExp.PropositionalExpression.parse_expression(tokens)
-        steps = [(expr, None)]
-        while len(tokens) > 0:
-            expr, name, tokens = PropositionalProof.parse_eq_rhs_reason(tokens)
-            steps.append((expr, name))
+        return list(PropositionalProof.iter_proof_steps(EP.TokenCursor(tokenizer.tokenize(script))))
+
+    @staticmethod
+    def iter_proof_script(source):
+        tokenizer = PTk.PropositionalProofTokenizer()
+        return PropositionalProof.iter_proof_steps(EP.StreamingTokenCursor(tokenizer.iter_tokens(source)))
+
+    @staticmethod
+    def iter_proof_steps(cursor):
+        yield PExp.PropositionalExpression.parse_expression(cursor), None
+        while not cursor.at_end():
+            yield PropositionalProof.parse_eq_rhs_reason(cursor)
+
+    @staticmethod
+    def steps_to_bytes(steps):
+        return PExp.PropositionalExpression.codec.encode([tuple(step) for step in steps])
+
+    @staticmethod
+    def steps_from_bytes(data):
+        steps = PExp.PropositionalExpression.codec.decode(data)
+        if not isinstance(steps, list):
+            raise ValueError("Encoded value is not a list of proof steps")
+        for i, step in enumerate(steps):
+            if (not isinstance(step, tuple) or len(step) != 2 or not isinstance(step[0], PExp.PropositionalExpression)
+                    or not (step[1] is None or isinstance(step[1], str))):
+                raise ValueError("Encoded proof step " + str(i) + " is not an (expression, reason) pair")
         return steps
 
     def check_proof(self, script=None):
@@ -82,82 +145,129 @@ class PropositionalProof:
                 self.steps = PropositionalProof.parse_proof_script(script)
             else:
                 self.steps = script
+        return self.check_steps(self.steps)
+
+    def check_proof_stream(self, source):
+        return self.check_steps(PropositionalProof.iter_proof_script(source))
+
+    def check_steps(self, steps):
         errors = []
-        if len(self.steps) == 0:
+        first = None
+        previous = None
+        left_to_right = None
+        count = 0
+        for expr, name in steps:
+            count += 1
+            if count == 1:
+                first = expr
+                if expr.equal(self.lhs):
+                    left_to_right = True
+                elif expr.equal(self.rhs):
+                    left_to_right = False
+                else:
+                    errors.append("First step does not match either the left- or right-hand side "
+                                  + "of the theorem you want to prove")
+            else:
+                error_msg = self.check_step(count, previous, expr, name)
+                if error_msg is not None:
+                    errors.append(error_msg)
+            previous = expr
+        if self.cache is not None:
+            self.cache.flush()
+        if count == 0:
             errors.append("Proof is empty")
             return errors
-        if self.steps[0][0].equal(self.lhs):
-            left_to_right = True
-        elif self.steps[0][0].equal(self.rhs):
-            left_to_right = False
-        else:
-            errors.append("First step does not match either the left- or right-hand side "
-                          + "of the theorem you want to prove")
-            left_to_right = None
-        for i in range(1, len(self.steps)):
-            if self.steps[i][1] in self.axioms:
-                axiom = self.axioms[self.steps[i][1]]
-            else:
-                errors.append("Step {} uses an unknown axiom: {}".format(i + 1, self.steps[i][1]))
-                continue
-            _, error_msg = self.does_axiom_apply(axiom, self.steps[i-1][0], self.steps[i][0])
-            if error_msg is None:
-                errors.append("Step {} does nothing".format(i + 1))
-                continue
-            elif error_msg is not True:
-                errors.append("Step {} {}".format(i + 1, error_msg))
         if left_to_right is None:
-            if not (self.steps[-1][0].equal(self.lhs) or self.steps[0][0].equal(self.rhs)):
+            if not (previous.equal(self.lhs) or first.equal(self.rhs)):
                 errors.append("Last step does not match either the left- or right-hand side "
                               + "of the theorem you want to prove")
         elif left_to_right:
-            if not self.steps[-1][0].equal(self.rhs):
+            if not previous.equal(self.rhs):
                 errors.append("Last step does not match the right-hand side of the theorem you want to prove")
         else:
-            if not self.steps[-1][0].equal(self.lhs):
+            if not previous.equal(self.lhs):
                 errors.append("Last step does not match the left-hand side of the theorem you want to prove")
         return errors
 
-    def does_axiom_apply(self, axiom, lhs, rhs):
-        if lhs.equal(rhs):
-            return None, None
-        m = self.valid_axiom_application(axiom, lhs, rhs)
-        if m is True:
-            return True, True
-        partial_match = m is None
-        if type(lhs) == type(rhs):
-            found_diff = False
-            for lhs_i, rhs_i in zip(lhs.children(), rhs.children()):
-                p_i, m_i = self.does_axiom_apply(axiom, lhs_i, rhs_i)
-                if p_i:
-                    partial_match = True
-                if m_i is None:
-                    continue
-                if m_i is True:
-                    if found_diff:
-                        return partial_match, "takes more than one step at a time"
-                    found_diff = True
-                else:
-                    return partial_match, m_i
-            return partial_match, True
-        if partial_match:
-            return True, "result does not follow from applying axiom correctly"
+    def check_step(self, step, previous, expr, name):
+        if name not in self.axioms:
+            suggestions = self.suggest_axioms(previous, expr)
+            if len(suggestions) > 0:
+                return "Step {} uses an unknown axiom: {} (did you mean {}?)".format(step, name,
+                                                                                      " or ".join(suggestions))
+            return "Step {} uses an unknown axiom: {}".format(step, name)
+        axiom = self.axioms[name]
+        if self.cache is None:
+            error_msg = self.does_axiom_apply(axiom, previous, expr)
         else:
-            return False, "does not match axiom used"
+            key = SC.StepCache.make_key("axiom", axiom[0], axiom[1], previous, expr)
+            error_msg = self.cache.lookup(key, lambda: self.does_axiom_apply(axiom, previous, expr))
+        if error_msg is None:
+            return "Step {} does nothing".format(step)
+        elif error_msg is not True:
+            return "Step {} {}".format(step, error_msg)
+        return None
+
+    def suggest_axioms(self, lhs, rhs):
+        suggestions = set()
+        for lhs_i, rhs_i in PropositionalProof.diff_path(lhs, rhs):
+            for name in self.axiom_tree.retrieve(lhs_i) + self.axiom_tree.retrieve(rhs_i):
+                if name not in suggestions and self.valid_axiom_application(self.axioms[name], lhs_i, rhs_i) is True:
+                    suggestions.add(name)
+        return sorted(suggestions)
 
     @staticmethod
-    def valid_axiom_application(axiom, lhs, rhs):
-        matcher = PMatch.PropositionalMatcher()
-        matcher.reset()
+    def diff_path(lhs, rhs):
+        path = []
+        while not lhs.equal(rhs):
+            path.append((lhs, rhs))
+            if type(lhs) != type(rhs):
+                break
+            diffs = [(lhs_i, rhs_i) for lhs_i, rhs_i in zip(lhs.children(), rhs.children()) if not lhs_i.equal(rhs_i)]
+            if len(diffs) != 1:
+                break
+            lhs, rhs = diffs[0]
+        return path
+
+    def does_axiom_apply(self, axiom, lhs, rhs):
+        if lhs.equal(rhs):
+            return None
+        # Every differing pair must be justified by the axiom somewhere on its diff path. A None entry marks a
+        # node with two differing children, reached only once both of them have been justified.
+        pending = [(lhs, rhs)]
+        while len(pending) > 0:
+            pair = pending.pop()
+            if pair is None:
+                return "takes more than one step at a time"
+            path = PropositionalProof.diff_path(*pair)
+            m = None
+            for lhs_i, rhs_i in path:
+                m = self.valid_axiom_application(axiom, lhs_i, rhs_i)
+                if m is True:
+                    break
+            if m is True:
+                continue
+            lhs_i, rhs_i = path[-1]
+            if type(lhs_i) != type(rhs_i):
+                if m is None:
+                    return "result does not follow from applying axiom correctly"
+                return "does not match axiom used"
+            diffs = [(lhs_j, rhs_j) for lhs_j, rhs_j in zip(lhs_i.children(), rhs_i.children())
+                     if not lhs_j.equal(rhs_j)]
+            if len(diffs) > 1:
+                pending.extend([None, diffs[1], diffs[0]])
+        return True
+
+    def valid_axiom_application(self, axiom, lhs, rhs):
         partial_match = False
-        if matcher.match(axiom[0], lhs):
-            if matcher.replace(axiom[1]).equal(rhs):
-                return True
-            partial_match = True
-        if matcher.match(axiom[0], rhs):
-            if matcher.replace(axiom[1]).equal(lhs):
-                return True
-            partial_match = True
+        for source, target in ((lhs, rhs), (rhs, lhs)):
+            if not self.index.may_match(axiom[0], source):
+                continue
+            matcher = PMatch.PropositionalMatcher()
+            if matcher.match(axiom[0], source):
+                if self.index.may_match(axiom[1], target) and matcher.replace(axiom[1]).equal(target):
+                    return True
+                partial_match = True
         if partial_match:
             return False
         return None
@@ -0,0 +1,259 @@
+import heapq
+
+import prop_check.PropositionalExpression as PExp
+import prop_check.TreeFold as TF
+
+
+class TseitinEncoder:
+    def __init__(self):
+        self.var_ids = {}
+        self.num_vars = 0
+        self.clauses = []
+        self.true_var = None
+        self.cache = {}
+
+    def new_var(self):
+        self.num_vars += 1
+        return self.num_vars
+
+    def var_for_symbol(self, symbol):
+        if symbol not in self.var_ids:
+            self.var_ids[symbol] = self.new_var()
+        return self.var_ids[symbol]
+
+    def encode(self, expr):
+        return TF.fold(expr, lambda node, lits, _context: self.encode_node(node, lits), self.unencoded_children)
+
+    def unencoded_children(self, expr):
+        return () if expr in self.cache else expr.children()
+
+    def encode_node(self, expr, lits):
+        if expr in self.cache:
+            return self.cache[expr]
+        if isinstance(expr, PExp.ConstantExpression):
+            if self.true_var is None:
+                self.true_var = self.new_var()
+                self.clauses.append([self.true_var])
+            lit = self.true_var if expr.value else -self.true_var
+        elif isinstance(expr, PExp.VariableExpression):
+            lit = self.var_for_symbol(expr.symbol)
+        elif isinstance(expr, PExp.NotExpression):
+            lit = -lits[0]
+        else:
+            a, b = lits
+            lit = self.new_var()
+            if isinstance(expr, PExp.AndExpression):
+                self.clauses.extend([[-lit, a], [-lit, b], [lit, -a, -b]])
+            elif isinstance(expr, PExp.OrExpression):
+                self.clauses.extend([[lit, -a], [lit, -b], [-lit, a, b]])
+            elif isinstance(expr, PExp.ImpliesExpression):
+                self.clauses.extend([[lit, a], [lit, -b], [-lit, -a, b]])
+            elif isinstance(expr, PExp.IffExpression):
+                self.clauses.extend([[-lit, -a, b], [-lit, a, -b], [lit, a, b], [lit, -a, -b]])
+            else:
+                raise ValueError("Internal Error: Unknown Binary Expression: " + str(expr))
+        self.cache[expr] = lit
+        return lit
+
+
+class PropositionalSatSolver:
+    def __init__(self, num_vars, clauses):
+        self.num_vars = num_vars
+        self.values = [0] * (num_vars + 1)
+        self.levels = [0] * (num_vars + 1)
+        self.reasons = [None] * (num_vars + 1)
+        self.phases = [1] * (num_vars + 1)
+        self.activity = [0.0] * (num_vars + 1)
+        self.activity_inc = 1.0
+        self.order = [(0.0, v) for v in range(1, num_vars + 1)]
+        self.watches = [[] for _ in range(2 * num_vars + 2)]
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.ok = True
+        for clause in clauses:
+            self.add_clause(clause)
+
+    @staticmethod
+    def watch_index(lit):
+        return 2 * lit if lit > 0 else -2 * lit + 1
+
+    def value(self, lit):
+        v = self.values[abs(lit)]
+        return v if lit > 0 else -v
+
+    def decision_level(self):
+        return len(self.trail_lim)
+
+    def add_clause(self, clause):
+        lits = []
+        for lit in clause:
+            if -lit in lits:
+                return
+            if lit not in lits:
+                lits.append(lit)
+        if len(lits) == 0:
+            self.ok = False
+        elif len(lits) == 1:
+            if self.value(lits[0]) == -1:
+                self.ok = False
+            elif self.value(lits[0]) == 0:
+                self.assign(lits[0], None)
+        else:
+            self.watches[PropositionalSatSolver.watch_index(lits[0])].append(lits)
+            self.watches[PropositionalSatSolver.watch_index(lits[1])].append(lits)
+
+    def assign(self, lit, reason):
+        v = abs(lit)
+        self.values[v] = 1 if lit > 0 else -1
+        self.levels[v] = self.decision_level()
+        self.reasons[v] = reason
+        self.trail.append(lit)
+
+    def propagate(self):
+        while self.qhead < len(self.trail):
+            false_lit = -self.trail[self.qhead]
+            self.qhead += 1
+            index = PropositionalSatSolver.watch_index(false_lit)
+            watchers = self.watches[index]
+            kept = []
+            self.watches[index] = kept
+            for pos in range(len(watchers)):
+                clause = watchers[pos]
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], clause[0]
+                first = clause[0]
+                if self.value(first) == 1:
+                    kept.append(clause)
+                    continue
+                for k in range(2, len(clause)):
+                    if self.value(clause[k]) != -1:
+                        clause[1], clause[k] = clause[k], clause[1]
+                        self.watches[PropositionalSatSolver.watch_index(clause[1])].append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    if self.value(first) == -1:
+                        kept.extend(watchers[pos + 1:])
+                        self.qhead = len(self.trail)
+                        return clause
+                    self.assign(first, clause)
+        return None
+
+    def bump(self, v):
+        self.activity[v] += self.activity_inc
+        if self.activity[v] > 1e100:
+            for i in range(1, self.num_vars + 1):
+                self.activity[i] *= 1e-100
+            self.activity_inc *= 1e-100
+            self.order = [(-self.activity[i], i) for i in range(1, self.num_vars + 1) if self.values[i] == 0]
+            heapq.heapify(self.order)
+        else:
+            heapq.heappush(self.order, (-self.activity[v], v))
+
+    def analyze(self, conflict):
+        seen = set()
+        learnt = [0]
+        counter = 0
+        p = None
+        clause = conflict
+        index = len(self.trail) - 1
+        level = self.decision_level()
+        while True:
+            for q in (clause if p is None else clause[1:]):
+                v = abs(q)
+                if v not in seen and self.levels[v] > 0:
+                    seen.add(v)
+                    self.bump(v)
+                    if self.levels[v] == level:
+                        counter += 1
+                    else:
+                        learnt.append(q)
+            while abs(self.trail[index]) not in seen:
+                index -= 1
+            p = self.trail[index]
+            index -= 1
+            clause = self.reasons[abs(p)]
+            counter -= 1
+            if counter == 0:
+                break
+        learnt[0] = -p
+        back_level = 0
+        if len(learnt) > 1:
+            best = 1
+            for i in range(2, len(learnt)):
+                if self.levels[abs(learnt[i])] > self.levels[abs(learnt[best])]:
+                    best = i
+            learnt[1], learnt[best] = learnt[best], learnt[1]
+            back_level = self.levels[abs(learnt[1])]
+        self.activity_inc /= 0.95
+        return learnt, back_level
+
+    def backtrack(self, level):
+        if self.decision_level() <= level:
+            return
+        start = self.trail_lim[level]
+        for lit in self.trail[start:]:
+            v = abs(lit)
+            self.phases[v] = self.values[v]
+            self.values[v] = 0
+            self.reasons[v] = None
+            heapq.heappush(self.order, (-self.activity[v], v))
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.qhead = len(self.trail)
+        if len(self.order) > 4 * self.num_vars + 64:
+            self.order = [(-self.activity[v], v) for v in range(1, self.num_vars + 1) if self.values[v] == 0]
+            heapq.heapify(self.order)
+
+    def pick_branch_var(self):
+        while self.order:
+            _, v = heapq.heappop(self.order)
+            if self.values[v] == 0:
+                return v
+        return None
+
+    def solve(self):
+        if not self.ok or self.propagate() is not None:
+            return None
+        heapq.heapify(self.order)
+        conflicts = 0
+        restart_limit = 100
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                if self.decision_level() == 0:
+                    return None
+                learnt, back_level = self.analyze(conflict)
+                self.backtrack(back_level)
+                if len(learnt) == 1:
+                    self.assign(learnt[0], None)
+                else:
+                    self.watches[PropositionalSatSolver.watch_index(learnt[0])].append(learnt)
+                    self.watches[PropositionalSatSolver.watch_index(learnt[1])].append(learnt)
+                    self.assign(learnt[0], learnt)
+                conflicts += 1
+                if conflicts >= restart_limit:
+                    conflicts = 0
+                    restart_limit = int(restart_limit * 1.5)
+                    self.backtrack(0)
+            else:
+                v = self.pick_branch_var()
+                if v is None:
+                    return [self.values[i] == 1 for i in range(self.num_vars + 1)]
+                self.trail_lim.append(len(self.trail))
+                self.assign(v if self.phases[v] == 1 else -v, None)
+
+    @staticmethod
+    def find_falsifying_bindings(expr, var_names):
+        encoder = TseitinEncoder()
+        top = encoder.encode(expr)
+        encoder.clauses.append([-top])
+        solver = PropositionalSatSolver(encoder.num_vars, encoder.clauses)
+        model = solver.solve()
+        if model is None:
+            return None
+        bindings = {}
+        for name in var_names:
+            bindings[name] = model[encoder.var_ids[name]] if name in encoder.var_ids else True
+        return bindings
@@ -0,0 +1,77 @@
+import collections
+import json
+import os
+
+
+class StepCache:
+    def __init__(self, max_entries=100000, max_bytes=64 * 1024 * 1024, path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+        self.pid = os.getpid()
+        self.connection = None
+        if path is not None:
+            # Only persistent caches need sqlite3, so in-memory ones do not pay for importing it
+            import sqlite3
+            self.connection = sqlite3.connect(path, timeout=30)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS steps (key TEXT PRIMARY KEY, value TEXT)")
+            self.connection.commit()
+
+    @staticmethod
+    def make_key(*parts):
+        # str() gives the fully parenthesized structural form, so equal keys mean equal trees
+        return "\x1f".join(str(part) for part in parts)
+
+    def lookup(self, key, compute):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return json.loads(self.entries[key])
+        row = None
+        if self.connection is not None:
+            row = self.connection.execute("SELECT value FROM steps WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self.hits += 1
+            value = row[0]
+        else:
+            self.misses += 1
+            value = json.dumps(compute())
+            if self.connection is not None:
+                self.connection.execute("INSERT OR REPLACE INTO steps (key, value) VALUES (?, ?)", (key, value))
+                self.pending += 1
+        self.store(key, value)
+        return json.loads(value)
+
+    @staticmethod
+    def entry_bytes(key, value):
+        # UTF-8 sizes, so proofs with non-ASCII text count against max_bytes by what they actually take
+        return len(key.encode("utf-8")) + len(value.encode("utf-8"))
+
+    def store(self, key, value):
+        if key in self.entries:
+            self.num_bytes -= StepCache.entry_bytes(key, self.entries[key])
+        self.entries[key] = value
+        self.num_bytes += StepCache.entry_bytes(key, value)
+        while len(self.entries) > self.max_entries or (self.num_bytes > self.max_bytes and len(self.entries) > 1):
+            old_key, old_value = self.entries.popitem(last=False)
+            self.num_bytes -= StepCache.entry_bytes(old_key, old_value)
+
+    def clear(self):
+        # Only the in-memory entries; rows already in the persistent store stay
+        self.entries.clear()
+        self.num_bytes = 0
+
+    def flush(self):
+        if self.connection is not None and self.pending > 0:
+            self.connection.commit()
+            self.pending = 0
+
+    def close(self):
+        self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,66 @@
+def default_children(node):
+    return node.children()
+
+
+def fold(root, step, children=default_children, enter=None, context=None):
+    # Post-order fold with an explicit stack, so formula depth is not limited by the Python recursion limit.
+    # step(node, child_results, context) combines the results of the children; enter(node, context) gives the
+    # context for the children of node. Without enter, shared (hash-consed) subtrees are folded only once.
+    memo = {} if enter is None else None
+    results = []
+    stack = [(root, context, None)]
+    while len(stack) > 0:
+        node, ctx, kids = stack.pop()
+        if kids is None:
+            if memo is not None and node in memo:
+                results.append(memo[node])
+                continue
+            kids = children(node)
+            if len(kids) > 0:
+                stack.append((node, ctx, kids))
+                child_ctx = ctx if enter is None else enter(node, ctx)
+                for child in reversed(kids):
+                    stack.append((child, child_ctx, None))
+                continue
+            value = step(node, (), ctx)
+        else:
+            values = results[len(results) - len(kids):]
+            del results[len(results) - len(kids):]
+            value = step(node, values, ctx)
+        if memo is not None:
+            memo[node] = value
+        results.append(value)
+    return results[0]
+
+
+def match(pattern, expr, step):
+    # step(pattern, expr) returns False on a mismatch, True when the pair is done, or the child pairs to match next
+    stack = [(pattern, expr)]
+    while len(stack) > 0:
+        pattern, expr = stack.pop()
+        pairs = step(pattern, expr)
+        if pairs is False:
+            return False
+        if pairs is not True:
+            stack.extend(reversed(pairs))
+    return True
+
+
+def render(root, parts, level=0):
+    # parts(node, level) returns the text of node as strings interleaved with (child, level) pairs
+    text = []
+    stack = [(root, level)]
+    while len(stack) > 0:
+        item = stack.pop()
+        if isinstance(item, str):
+            text.append(item)
+        else:
+            stack.extend(reversed(parts(*item)))
+    return "".join(text)
+
+
+def leading_text(root, parts, level=0):
+    first = (root, level)
+    while not isinstance(first, str):
+        first = parts(*first)[0]
+    return first